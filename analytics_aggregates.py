@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+Analytics aggregates for Maps to Waze Bot
+Rolling counters, heavy hitters and latency sketch updated per event, read in O(1)
+"""
+
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(timespec='seconds')
+
+
+class RollingCounter:
+    """Fixed ring of time buckets (e.g. 60 one-minute buckets); old buckets are reused in place"""
+
+    def __init__(self, width: int, slots: int):
+        self.width = width
+        self.slots = slots
+        self._bucket_ids = [-1] * slots
+        self._counts = [0] * slots
+        self._successes = [0] * slots
+
+    def add(self, ts: float, success: bool):
+        bucket_id = int(ts // self.width)
+        slot = bucket_id % self.slots
+        if self._bucket_ids[slot] != bucket_id:
+            self._bucket_ids[slot] = bucket_id
+            self._counts[slot] = 0
+            self._successes[slot] = 0
+        self._counts[slot] += 1
+        self._successes[slot] += int(success)
+
+    def series(self, now: float) -> List[Dict[str, Any]]:
+        """Oldest to newest, including empty buckets"""
+        current = int(now // self.width)
+        result = []
+        for bucket_id in range(current - self.slots + 1, current + 1):
+            slot = bucket_id % self.slots
+            live = self._bucket_ids[slot] == bucket_id
+            result.append({
+                "start": _iso(bucket_id * self.width),
+                "count": self._counts[slot] if live else 0,
+                "successful": self._successes[slot] if live else 0
+            })
+        return result
+
+
+class LatencySketch:
+    """
+    Log-bucketed quantile sketch: values within `relative_accuracy` of the
+    true quantile, memory bounded by the value range, not the sample count.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-4):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self._buckets: Counter = Counter()
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        index = math.ceil(math.log(max(value, self.min_value)) / self._log_gamma)
+        self._buckets[index] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return None
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+class TopCounter:
+    """Space-Saving heavy hitters: approximate top-k with k counters"""
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._counts: Dict[Any, int] = {}
+
+    def add(self, key: Any):
+        counts = self._counts
+        if key in counts:
+            counts[key] += 1
+        elif len(counts) < self.capacity:
+            counts[key] = 1
+        else:
+            # Replace the smallest counter; its count carries over as the error bound
+            smallest = min(counts, key=counts.get)
+            counts[key] = counts.pop(smallest) + 1
+
+    def top(self, n: int) -> List[tuple]:
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+
+class AnalyticsAggregates:
+    """
+    Dashboard statistics maintained incrementally from analytics events.
+
+    apply() costs O(1) per event (O(k) when a new user displaces a top-user
+    counter). Reads build a snapshot only when events arrived since the last
+    read, so repeated dashboard refreshes are served from memory.
+    """
+
+    def __init__(self, max_users: int = 100000, recent_days: int = 7, top_users: int = 10):
+        self.max_users = max_users
+        self.recent_days = recent_days
+        self.top_users_shown = top_users
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self.version = 0
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_version = -1
+
+        self.total_interactions = 0
+        self.actions: Counter = Counter()
+        self.links_total = 0
+        self.links_successful = 0
+        self.requests_total = 0
+        self.requests_successful = 0
+        self.requests_by_type: Dict[str, Dict[str, Any]] = {}
+        self.latency = LatencySketch()
+        self.languages: Counter = Counter()
+        self.per_minute = RollingCounter(MINUTE, 60)
+        self.per_hour = RollingCounter(HOUR, 24)
+        self.per_day = RollingCounter(DAY, 30)
+        self.top_users = TopCounter()
+        self._daily: OrderedDict = OrderedDict()  # day -> {"interactions": n, "users": set()}
+        self._users: OrderedDict = OrderedDict()  # user_id -> per-user record, LRU order
+        self.users_seen = 0
+
+    # Updates ------------------------------------------------------------
+
+    def apply_batch(self, events: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for event in events:
+                self._apply(event)
+            self.version += 1
+
+    def _apply(self, event: Dict[str, Any]):
+        ts = event.get('ts') or time.time()
+        user_id = event.get('user_id')
+        user = self._user(user_id, ts, event.get('user_info')) if user_id is not None else None
+        kind = event.get('type')
+
+        if kind == 'user_interaction':
+            success = bool(event.get('success', True))
+            action = event.get('action', 'unknown')
+            self.total_interactions += 1
+            self.actions[action] += 1
+            self._add_daily(ts, user_id)
+            if user is not None:
+                user['total_interactions'] += 1
+                user['successful_interactions' if success else 'failed_interactions'] += 1
+                user['actions'][action] += 1
+        elif kind == 'link_processing':
+            success = bool(event.get('success'))
+            self.links_total += 1
+            self.links_successful += int(success)
+            if user is not None:
+                user['links'] += 1
+        elif kind == 'request':
+            success = bool(event.get('success'))
+            response_time = float(event.get('response_time') or 0.0)
+            self.requests_total += 1
+            self.requests_successful += int(success)
+            by_type = self.requests_by_type.setdefault(
+                event.get('request_type', 'unknown'), {"count": 0, "successful": 0, "total_time": 0.0})
+            by_type['count'] += 1
+            by_type['successful'] += int(success)
+            by_type['total_time'] += response_time
+            self.latency.add(response_time)
+            self.per_minute.add(ts, success)
+            self.per_hour.add(ts, success)
+            self.per_day.add(ts, success)
+            if user_id is not None:
+                self.top_users.add(user_id)
+        elif kind == 'language_change':
+            language = event.get('language')
+            if user is not None:
+                if user['language']:
+                    self.languages[user['language']] -= 1
+                user['language'] = language
+            self.languages[language] += 1
+
+    def _user(self, user_id: int, ts: float, user_info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        users = self._users
+        user = users.get(user_id)
+        if user is None:
+            self.users_seen += 1
+            user = users[user_id] = {
+                "first_seen": ts, "last_seen": ts, "user_info": None, "language": None,
+                "total_interactions": 0, "successful_interactions": 0, "failed_interactions": 0,
+                "links": 0, "actions": Counter()
+            }
+            if len(users) > self.max_users:
+                users.popitem(last=False)
+        else:
+            users.move_to_end(user_id)
+        user['last_seen'] = max(user['last_seen'], ts)
+        if user_info:
+            user['user_info'] = user_info
+        return user
+
+    def _add_daily(self, ts: float, user_id: Optional[int]):
+        day = datetime.fromtimestamp(ts, tz=timezone.utc).date().isoformat()
+        daily = self._daily.get(day)
+        if daily is None:
+            daily = self._daily[day] = {"interactions": 0, "users": set()}
+            while len(self._daily) > self.recent_days:
+                self._daily.popitem(last=False)
+        daily['interactions'] += 1
+        if user_id is not None:
+            daily['users'].add(user_id)
+
+    # Reads --------------------------------------------------------------
+
+    def get_global_stats(self) -> Dict[str, Any]:
+        """
+        Dashboard statistics. Counters are rebuilt only when events arrived
+        since the last call; uptime and the per-minute, hourly and daily
+        series depend on the clock and are added on every read.
+        """
+        now = time.time()
+        with self._lock:
+            if self._snapshot_version != self.version:
+                self._snapshot = self._build_snapshot()
+                self._snapshot_version = self.version
+            stats = dict(self._snapshot)
+            stats["uptime"] = str(int(now - self.started)) + 's'
+            stats["requests_per_minute"] = self.per_minute.series(now)
+            stats["requests_per_hour"] = self.per_hour.series(now)
+            stats["requests_per_day"] = self.per_day.series(now)
+        return stats
+
+    def _build_snapshot(self) -> Dict[str, Any]:
+        requests_failed = self.requests_total - self.requests_successful
+        by_type = {
+            request_type: {
+                "count": stats['count'],
+                "successful": stats['successful'],
+                "failed": stats['count'] - stats['successful'],
+                "avg_response_time": round(stats['total_time'] / stats['count'], 3) if stats['count'] else 0
+            }
+            for request_type, stats in self.requests_by_type.items()
+        }
+        latency = {f"p{int(q * 100)}": round(self.latency.quantile(q) or 0.0, 3) for q in (0.5, 0.9, 0.95, 0.99)}
+        return {
+            "total_users": self.users_seen,
+            "total_interactions": self.total_interactions,
+            "success_rate": round(self.requests_successful / self.requests_total * 100, 1) if self.requests_total else 0,
+            "request_stats": {
+                "total_requests": self.requests_total,
+                "successful": self.requests_successful,
+                "failed": requests_failed,
+                "avg_response_time": round(self.latency.mean, 3),
+                "by_type": by_type
+            },
+            "response_time_percentiles": latency,
+            "link_processing": {
+                "total": self.links_total,
+                "successful": self.links_successful,
+                "failed": self.links_total - self.links_successful
+            },
+            "top_commands": dict(self.actions.most_common(10)),
+            "top_users": [{"user_id": user_id, "requests": count}
+                          for user_id, count in self.top_users.top(self.top_users_shown)],
+            "language_distribution": {lang: count for lang, count in self.languages.items() if count > 0},
+            "recent_activity": [
+                {"date": day, "stats": {"total_interactions": daily['interactions'],
+                                        "unique_users": len(daily['users'])}}
+                for day, daily in reversed(self._daily.items())
+            ]
+        }
+
+    def get_user_stats(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                return None
+            return {
+                "user_info": user['user_info'],
+                "first_seen": _iso(user['first_seen']),
+                "last_seen": _iso(user['last_seen']),
+                "total_interactions": user['total_interactions'],
+                "successful_interactions": user['successful_interactions'],
+                "failed_interactions": user['failed_interactions'],
+                "links_processed": user['links'],
+                "language": user['language'],
+                "actions": dict(user['actions'])
+            }
+
+
+# Process-wide aggregates, fed by the analytics sink's writer thread
+analytics_aggregates = AnalyticsAggregates()
@@ -0,0 +1,355 @@
+# -*- coding: utf-8 -*-
+"""
+Analytics event sink for Maps to Waze Bot
+Handlers only append to a bounded ring buffer; a background thread writes batches
+"""
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+# Message text and Telegram profile fields stay in memory; storage gets the rest
+PRIVATE_FIELDS = ('text', 'user_info')
+
+DAY_SECONDS = 86400
+
+
+def stored_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """The event as written to storage, without PRIVATE_FIELDS"""
+    return {key: value for key, value in event.items() if key not in PRIVATE_FIELDS}
+
+
+class JsonlEventWriter:
+    """
+    Append events as JSON lines, one file per UTC day next to `path`
+    (events.jsonl -> events-2024-05-01.jsonl). Files older than
+    retention_days are deleted when a new day's file is opened.
+    """
+
+    def __init__(self, path: str, retention_days: float = 30):
+        self.path = path
+        self.retention_days = retention_days
+        self._root, self._extension = os.path.splitext(path)
+        self._file = None
+        self._day = None
+
+    def _segment_path(self, day: str) -> str:
+        return f"{self._root}-{day}{self._extension}"
+
+    def _segments(self) -> List[tuple]:
+        """(day, path) of every daily file, oldest first"""
+        prefix = len(self._root) + 1
+        segments = []
+        for path in glob.glob(glob.escape(self._root) + '-*' + self._extension):
+            day = path[prefix:len(path) - len(self._extension)]
+            if len(day) == 10:
+                segments.append((day, path))
+        return sorted(segments)
+
+    def write_batch(self, events: List[Dict[str, Any]]):
+        day = time.strftime('%Y-%m-%d', time.gmtime())
+        if self._file is None or day != self._day:
+            self.close()
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self._segment_path(day), 'a', encoding='utf-8')
+            self._day = day
+            self.prune()
+        self._file.write(''.join(json.dumps(stored_event(event), ensure_ascii=False) + '\n'
+                                 for event in events))
+        self._file.flush()
+
+    def prune(self):
+        """Delete daily files older than retention_days"""
+        oldest = time.strftime('%Y-%m-%d', time.gmtime(time.time() - self.retention_days * DAY_SECONDS))
+        for day, path in self._segments():
+            if day < oldest:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not delete old analytics file {path}: {e}")
+
+    def read_events(self, since: float) -> Iterator[Dict[str, Any]]:
+        """Stored events newer than `since`; daily files before that day are not opened"""
+        first_day = time.strftime('%Y-%m-%d', time.gmtime(since))
+        for day, path in self._segments():
+            if day < first_day:
+                continue
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            event = json.loads(line)
+                        except ValueError:
+                            continue
+                        if event.get('ts', 0) >= since:
+                            yield event
+            except FileNotFoundError:
+                continue
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._day = None
+
+
+class SqliteEventWriter:
+    """
+    Insert events into a WAL-mode SQLite table, one transaction per batch.
+    Events older than retention_days are deleted at most once a day.
+    """
+
+    def __init__(self, path: str, retention_days: float = 30):
+        self.path = path
+        self.retention_days = retention_days
+        self._db: Optional[sqlite3.Connection] = None
+        self._pruned_at = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS events ('
+            'ts REAL NOT NULL, type TEXT NOT NULL, user_id INTEGER, data TEXT NOT NULL)'
+        )
+        db.execute('CREATE INDEX IF NOT EXISTS events_user_ts ON events (user_id, ts)')
+        db.execute('CREATE INDEX IF NOT EXISTS events_ts ON events (ts)')
+        return db
+
+    def write_batch(self, events: List[Dict[str, Any]]):
+        if self._db is None:
+            self._db = self._connect()
+        if time.time() - self._pruned_at >= DAY_SECONDS:
+            self.prune()
+        rows = [(event['ts'], event['type'], event.get('user_id'),
+                 json.dumps(stored_event(event), ensure_ascii=False))
+                for event in events]
+        self._db.execute('BEGIN')
+        try:
+            self._db.executemany('INSERT INTO events (ts, type, user_id, data) VALUES (?, ?, ?, ?)', rows)
+            self._db.execute('COMMIT')
+        except sqlite3.Error:
+            self._db.execute('ROLLBACK')
+            raise
+
+    def prune(self):
+        """Delete events older than retention_days"""
+        self._pruned_at = time.time()
+        self._db.execute('DELETE FROM events WHERE ts < ?', (self._pruned_at - self.retention_days * DAY_SECONDS,))
+
+    def read_events(self, since: float) -> Iterator[Dict[str, Any]]:
+        """Stored events newer than `since`, oldest first"""
+        if not os.path.exists(self.path):
+            return
+        if self._db is None:
+            self._db = self._connect()
+        for (data,) in self._db.execute('SELECT data FROM events WHERE ts >= ? ORDER BY ts', (since,)):
+            yield json.loads(data)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+class NullEventWriter:
+    """Discard events (storage disabled)"""
+
+    def write_batch(self, events: List[Dict[str, Any]]):
+        pass
+
+    def read_events(self, since: float) -> Iterator[Dict[str, Any]]:
+        return iter(())
+
+    def close(self):
+        pass
+
+
+# Event type -> call on the legacy analytics module
+_FORWARDERS = {
+    'user_interaction': lambda target, e: target.track_user_interaction(
+        e['user_id'], e['action'], e['success'], e['metadata'], e['user_info']),
+    'link_processing': lambda target, e: target.track_link_processing(
+        e['user_id'], e['text'], e['success'], coordinates=e['coordinates'], error=e['error']),
+    'request': lambda target, e: target.track_request(
+        e['user_id'], e['request_type'], e['text'], e['response_time'], e['success'], e['user_info']),
+    'language_change': lambda target, e: target.track_language_change(e['user_id'], e['language']),
+}
+
+
+class AnalyticsSink:
+    """
+    Non-blocking analytics: track_* calls append an event to a bounded ring
+    buffer and return. A daemon thread writes batches when batch_size
+    events are waiting or every flush_interval seconds. When the buffer is
+    full the oldest event is overwritten and counted as dropped, so
+    handlers never wait for storage. Listeners receive every batch on the
+    writer thread, after storage.
+    """
+
+    def __init__(self, writer, capacity: int = 10000, batch_size: int = 500,
+                 flush_interval: float = 2.0, forward_to=None):
+        self.writer = writer
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.forward_to = forward_to
+        self._listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.write_errors = 0
+        self.batches = 0
+
+    # Hot path ------------------------------------------------------------
+
+    def _enqueue(self, event: Dict[str, Any]):
+        event['ts'] = time.time()
+        with self._lock:
+            if len(self._buffer) == self.capacity:
+                self.dropped += 1
+            self._buffer.append(event)
+            self.enqueued += 1
+            pending = len(self._buffer)
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def track_user_interaction(self, user_id: int, action: str, success: bool = True,
+                               metadata: Optional[Dict[str, Any]] = None,
+                               user_info: Optional[Dict[str, Any]] = None):
+        self._enqueue({'type': 'user_interaction', 'user_id': user_id, 'action': action,
+                       'success': success, 'metadata': metadata, 'user_info': user_info})
+
+    def track_link_processing(self, user_id: int, text: str, success: bool,
+                              coordinates=None, error: Optional[str] = None):
+        self._enqueue({'type': 'link_processing', 'user_id': user_id, 'text': text, 'success': success,
+                       'coordinates': list(coordinates) if coordinates else None, 'error': error})
+
+    def track_request(self, user_id: int, request_type: str, text: str, response_time: float,
+                      success: bool, user_info: Optional[Dict[str, Any]] = None):
+        self._enqueue({'type': 'request', 'user_id': user_id, 'request_type': request_type, 'text': text,
+                       'response_time': response_time, 'success': success, 'user_info': user_info})
+
+    def track_language_change(self, user_id: int, language: str):
+        self._enqueue({'type': 'language_change', 'user_id': user_id, 'language': language})
+
+    # Background writer ------------------------------------------------------
+
+    def add_listener(self, listener: Callable[[List[Dict[str, Any]]], None]):
+        """Call listener(batch) for every batch the writer thread handles"""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start the writer thread (idempotent)"""
+        if self._thread is not None:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='analytics-writer', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far, in batches of batch_size"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    if not self._buffer:
+                        return
+                    count = min(len(self._buffer), self.batch_size)
+                    batch = [self._buffer.popleft() for _ in range(count)]
+                self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            self.writer.write_batch(batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.write_errors += 1
+            logger.error(f"Could not write {len(batch)} analytics events: {e}")
+        for listener in self._listeners:
+            try:
+                listener(batch)
+            except Exception as e:
+                logger.warning(f"Analytics listener failed: {e}")
+        if self.forward_to is not None:
+            for event in batch:
+                try:
+                    _FORWARDERS[event['type']](self.forward_to, event)
+                except Exception as e:
+                    logger.warning(f"Analytics forwarding failed: {e}")
+
+    def close(self):
+        """Stop the writer thread, write what is left and close storage"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        self.writer.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for admin stats and metrics"""
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "write_errors": self.write_errors
+        }
+
+
+def create_event_writer():
+    """
+    Event storage from ANALYTICS_SINK (none, jsonl or sqlite), ANALYTICS_PATH
+    and ANALYTICS_RETENTION_DAYS; nothing is stored unless a backend is chosen
+    """
+    backend = os.getenv('ANALYTICS_SINK', 'none').lower()
+    retention_days = float(os.getenv('ANALYTICS_RETENTION_DAYS', 30))
+    if backend == 'sqlite':
+        return SqliteEventWriter(os.getenv('ANALYTICS_PATH', 'data/analytics_events.sqlite3'), retention_days)
+    if backend == 'jsonl':
+        return JsonlEventWriter(os.getenv('ANALYTICS_PATH', 'data/analytics_events.jsonl'), retention_days)
+    if backend != 'none':
+        logger.warning(f"Unknown ANALYTICS_SINK '{backend}', not storing analytics events")
+    return NullEventWriter()
+
+
+# Process-wide analytics sink; the bot starts its writer thread at startup
+analytics_sink = AnalyticsSink(
+    create_event_writer(),
+    capacity=int(os.getenv('ANALYTICS_BUFFER_SIZE', 10000)),
+    batch_size=int(os.getenv('ANALYTICS_BATCH_SIZE', 500)),
+    flush_interval=float(os.getenv('ANALYTICS_FLUSH_INTERVAL', 2))
+)
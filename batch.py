@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Batch link conversion for Maps to Waze Bot
+Streams links through the bot's resolver with bounded parallelism and shared caches
+"""
+
+import asyncio
+import csv
+import json
+import logging
+import time
+from collections import deque, namedtuple
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from maps_to_waze_bot import (
+    RESOLUTION_DEADLINE, SHORT_URL_PATTERN, extract_coordinates_from_input, generate_waze_link
+)
+from endpoint_health import CircuitOpenError
+from rate_limit import OutboundBudgetExhausted
+from resolution_cache import normalize_short_url
+from worker_pool import PoolBusyError
+
+logger = logging.getLogger(__name__)
+
+# One output row per unique input link
+BatchResult = namedtuple('BatchResult', ['line', 'input', 'lat', 'lng', 'waze_url', 'status'])
+
+RESULT_FIELDS = BatchResult._fields
+
+# Pause before retrying a link rejected by a saturated worker pool, doubled
+# after every rejection up to BUSY_RETRY_MAX_DELAY
+BUSY_RETRY_DELAY = 0.05
+BUSY_RETRY_MAX_DELAY = 2.0
+
+
+def iter_links(lines: Iterable[str]) -> Iterator[Tuple[int, str]]:
+    """Yield (line number, link) for non-empty, non-comment input lines"""
+    for line_number, line in enumerate(lines, 1):
+        text = line.strip()
+        if text and not text.startswith('#'):
+            yield line_number, text
+
+
+def link_key(text: str) -> str:
+    """Deduplication key: short links by normalized URL, everything else verbatim"""
+    match = SHORT_URL_PATTERN.search(text)
+    if match:
+        return normalize_short_url(match.group(0))
+    return text
+
+
+class BatchStats:
+    """Counters for one batch run"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.total = 0
+        self.duplicates = 0
+        self.statuses = {}
+
+    def record(self, result: BatchResult):
+        self.statuses[result.status] = self.statuses.get(result.status, 0) + 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        unique = self.total - self.duplicates
+        return {
+            "total": self.total,
+            "unique": unique,
+            "duplicates": self.duplicates,
+            "statuses": dict(self.statuses),
+            "elapsed_seconds": round(elapsed, 3),
+            "links_per_minute": round(unique / elapsed * 60, 1) if elapsed else 0.0
+        }
+
+
+async def resolve_link(line_number: int, text: str, deadline: float = RESOLUTION_DEADLINE) -> BatchResult:
+    """
+    Resolve one link with the bot's pipeline (resolution cache, expander, API pool).
+    A busy worker pool is retried with exponential backoff until the deadline;
+    an open circuit or exhausted outbound budget ends the link at once with
+    status circuit_open or busy, since every retry would repeat the fetches.
+    """
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+    retry_delay = BUSY_RETRY_DELAY
+    while True:
+        remaining = expires - loop.time()
+        if remaining <= 0:
+            return BatchResult(line_number, text, None, None, None, 'timeout')
+        try:
+            lat, lng = await asyncio.wait_for(extract_coordinates_from_input(text), remaining)
+            break
+        except CircuitOpenError:
+            return BatchResult(line_number, text, None, None, None, 'circuit_open')
+        except OutboundBudgetExhausted:
+            return BatchResult(line_number, text, None, None, None, 'busy')
+        except PoolBusyError:
+            await asyncio.sleep(min(retry_delay, max(0.0, expires - loop.time())))
+            retry_delay = min(retry_delay * 2, BUSY_RETRY_MAX_DELAY)
+        except asyncio.TimeoutError:
+            return BatchResult(line_number, text, None, None, None, 'timeout')
+        except Exception as e:
+            logger.error(f"Error converting line {line_number}: {e}")
+            return BatchResult(line_number, text, None, None, None, 'error')
+
+    if lat is None or lng is None:
+        return BatchResult(line_number, text, None, None, None, 'not_found')
+    return BatchResult(line_number, text, lat, lng, generate_waze_link(lat, lng), 'ok')
+
+
+async def convert_links(lines: Iterable[str], concurrency: int = 16,
+                        deadline: float = RESOLUTION_DEADLINE,
+                        stats: Optional[BatchStats] = None) -> AsyncIterator[BatchResult]:
+    """
+    Convert a stream of links, yielding results in input order.
+
+    Input is consumed lazily: at most a small window of links is in memory
+    and at most `concurrency` of them resolve at the same time. Duplicate
+    links are resolved and reported once. Only dedup keys are retained for
+    the whole run.
+    """
+    if stats is None:
+        stats = BatchStats()
+    semaphore = asyncio.Semaphore(concurrency)
+    # A window wider than the concurrency keeps workers busy while the
+    # head of the (ordered) window is still resolving
+    window_size = concurrency * 4
+    window = deque()
+    seen = set()
+
+    async def run(line_number: int, text: str) -> BatchResult:
+        async with semaphore:
+            return await resolve_link(line_number, text, deadline)
+
+    try:
+        for line_number, text in iter_links(lines):
+            stats.total += 1
+            key = link_key(text)
+            if key in seen:
+                stats.duplicates += 1
+                continue
+            seen.add(key)
+            window.append(asyncio.ensure_future(run(line_number, text)))
+            if len(window) >= window_size:
+                result = await window.popleft()
+                stats.record(result)
+                yield result
+        while window:
+            result = await window.popleft()
+            stats.record(result)
+            yield result
+    finally:
+        for task in window:
+            task.cancel()
+
+
+class CsvResultWriter:
+    """Write results as CSV with a header row"""
+
+    def __init__(self, stream: TextIO):
+        self._writer = csv.writer(stream)
+        self._writer.writerow(RESULT_FIELDS)
+
+    def write(self, result: BatchResult):
+        self._writer.writerow(['' if value is None else value for value in result])
+
+
+class JsonlResultWriter:
+    """Write results as one JSON object per line"""
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def write(self, result: BatchResult):
+        self._stream.write(json.dumps(result._asdict(), ensure_ascii=False))
+        self._stream.write('\n')
+
+
+RESULT_WRITERS = {
+    'csv': CsvResultWriter,
+    'jsonl': JsonlResultWriter
+}
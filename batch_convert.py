@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Bulk conversion of Google Maps links to Waze links
+
+Usage:
+    python batch_convert.py links.txt -o waze_links.csv
+    cat links.txt | python batch_convert.py --format jsonl > waze_links.jsonl
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+# Add current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch import BatchStats, RESULT_WRITERS, convert_links
+from maps_to_waze_bot import RESOLUTION_DEADLINE
+from resolution_cache import resolution_cache
+from url_expander import short_url_expander
+from worker_pool import worker_pool
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert Google Maps links (one per line) to Waze links")
+    parser.add_argument('input', nargs='?', default='-', help="input file, '-' for stdin (default)")
+    parser.add_argument('-o', '--output', default='-', help="output file, '-' for stdout (default)")
+    parser.add_argument('-f', '--format', choices=sorted(RESULT_WRITERS),
+                        help="output format (default: from output extension, else csv)")
+    parser.add_argument('-c', '--concurrency', type=int, default=int(os.getenv('BATCH_CONCURRENCY', 16)),
+                        help="links resolved at the same time (default: 16)")
+    parser.add_argument('--deadline', type=float, default=RESOLUTION_DEADLINE,
+                        help="max seconds per link (default: RESOLUTION_DEADLINE)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="log every resolution step")
+    return parser.parse_args(argv)
+
+
+async def run(args, source, sink):
+    fmt = args.format or ('jsonl' if args.output.endswith('.jsonl') else 'csv')
+    writer = RESULT_WRITERS[fmt](sink)
+    stats = BatchStats()
+    try:
+        async for result in convert_links(source, args.concurrency, args.deadline, stats):
+            writer.write(result)
+    finally:
+        await short_url_expander.aclose()
+    return stats
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # The bot logs each resolution at INFO; keep bulk runs quiet unless asked
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    resolution_cache.load()
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    sink = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8', newline='')
+    try:
+        stats = asyncio.run(run(args, source, sink))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+        resolution_cache.close()
+        worker_pool.shutdown()
+
+    print(json.dumps(stats.get_stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
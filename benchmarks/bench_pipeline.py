@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Benchmark and golden-corpus check for the coordinate extraction pipeline
+
+Runs every entry of golden_corpus.jsonl through the extraction functions
+with the network layers stubbed out, checks results against the recorded
+expectations and reports per-shape latency percentiles and peak allocation
+per call. Timings are compared with baseline.json after normalizing by a
+calibration loop, so the baseline carries across machines.
+
+Usage:
+    python benchmarks/bench_pipeline.py                  # check + compare with baseline
+    python benchmarks/bench_pipeline.py --save-baseline  # record a new baseline
+    python benchmarks/bench_pipeline.py --record         # fill in expectations for new corpus entries
+
+Exit status: 0 ok, 1 golden mismatch, 2 performance regression
+"""
+import argparse
+import asyncio
+import gc
+import json
+import logging
+import math
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import maps_to_waze_bot as bot
+
+CORPUS_PATH = os.path.join(BENCH_DIR, 'golden_corpus.jsonl')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+
+# --- Corpus ---------------------------------------------------------------
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_corpus(corpus, path=CORPUS_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in corpus:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def is_full_url(entry):
+    """Full Google Maps URL (other map services have their own parser)"""
+    return entry['input'].startswith('http') and 'expanded' not in entry and entry['shape'] != 'other_map_url'
+
+
+# --- Offline stubs ----------------------------------------------------------
+
+class UnlimitedBudget:
+    """Outbound budget that never runs out; the stubs make no outbound calls"""
+
+    def acquire(self, kind):
+        pass
+
+    def try_acquire(self, kind):
+        return True
+
+
+class NullCache:
+    """Resolution cache that never hits, so every run measures the full pipeline"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, negative=False):
+        pass
+
+
+def install_stubs(corpus):
+    """Replace network-bound layers with corpus lookups"""
+    expansions = {}
+    api_locations = {}
+    for entry in corpus:
+        if 'expanded' in entry:
+            short_url = bot.SHORT_URL_PATTERN.search(entry['input']).group(0)
+            expansions[short_url] = entry['expanded']
+        if entry.get('api_location') and entry.get('place_id'):
+            api_locations[entry['place_id']] = tuple(entry['api_location'])
+
+    async def expand(url):
+        return expansions.get(url, url)
+
+    def place_location(place_id, context=None):
+        return api_locations.get(place_id, (None, None))
+
+    def text_search_location(query, context=None):
+        return None, None
+
+    bot.short_url_expander.expand = expand
+    bot.expand_short_url = lambda url: expansions.get(url, url)
+    bot.resolution_cache = NullCache()
+    bot.outbound_budget = UnlimitedBudget()
+    bot.places_client.budget = None
+    bot.GOOGLE_MAPS_API_AVAILABLE = True
+    bot.places_client._client = object()
+    bot.places_client.place_location = place_location
+    bot.places_client.text_search_location = text_search_location
+
+
+# --- Targets ----------------------------------------------------------------
+
+async def run_input(entry):
+    return await bot.extract_coordinates_from_input(entry['input'])
+
+
+async def run_all(entry):
+    return await bot.extract_all_coordinates_from_input(entry['input'])
+
+
+async def run_google_maps(entry):
+    return bot.extract_coordinates_from_google_maps(entry['input'])
+
+
+async def run_dms(entry):
+    return bot.parse_dms_coordinates(entry['input'])
+
+
+async def run_place_id(entry):
+    return bot.extract_place_id_from_url(entry['input'], expanded_url=entry.get('expanded', entry['input']))
+
+
+# name -> (callable, entry filter)
+TARGETS = {
+    'extract_coordinates_from_input': (run_input, lambda entry: True),
+    'extract_all_coordinates_from_input': (run_all, lambda entry: True),
+    'extract_coordinates_from_google_maps': (run_google_maps, is_full_url),
+    'parse_dms_coordinates': (run_dms, lambda entry: entry['shape'] in ('dms', 'not_location')),
+    'extract_place_id_from_url': (run_place_id, lambda entry: 'place_id' in entry),
+}
+
+
+def same_location(actual, expected):
+    if expected is None:
+        return actual[0] is None
+    return actual[0] is not None and abs(actual[0] - expected[0]) < 1e-9 and abs(actual[1] - expected[1]) < 1e-9
+
+
+async def check_golden(corpus):
+    """Compare every target with the recorded expectations; returns mismatch descriptions"""
+    mismatches = []
+    for entry in corpus:
+        expected = entry.get('expected')
+        checks = [('extract_coordinates_from_input', await run_input(entry), expected)]
+        if is_full_url(entry):
+            checks.append(('extract_coordinates_from_google_maps', await run_google_maps(entry), expected))
+        if entry['shape'] == 'dms':
+            checks.append(('parse_dms_coordinates', await run_dms(entry), expected))
+        all_locations = await run_all(entry)
+        first_found = next(((lat, lng) for _, lat, lng in all_locations if lat is not None), (None, None))
+        checks.append(('extract_all_coordinates_from_input', first_found, expected))
+        for name, actual, wanted in checks:
+            if not same_location(actual, wanted):
+                mismatches.append(f"{name} [{entry['shape']}] {entry['input']}\n  expected={wanted} actual={actual}")
+        if 'place_id' in entry:
+            actual = await run_place_id(entry)
+            if actual != entry['place_id']:
+                mismatches.append(f"extract_place_id_from_url [{entry['shape']}] {entry['input']}\n"
+                                  f"  expected={entry['place_id']!r} actual={actual!r}")
+    return mismatches
+
+
+async def record_expectations(corpus):
+    """Fill in missing expectations from the current implementation"""
+    for entry in corpus:
+        if 'expected' not in entry:
+            lat, lng = await run_input(entry)
+            entry['expected'] = None if lat is None else [lat, lng]
+        if 'place_id' not in entry and entry['input'].startswith('http'):
+            entry['place_id'] = await run_place_id(entry)
+
+
+# --- Measurement --------------------------------------------------------------
+
+def calibrate(rounds=7):
+    """Median time of a fixed regex/str/dict workload, in microseconds"""
+    pattern = re.compile(r'(-?\d+\.?\d*),\s*(-?\d+\.?\d*)')
+    text = "https://www.google.com/maps/place/X/@31.7767191,35.2318158,17z"
+
+    def workload():
+        counts = {}
+        for i in range(2000):
+            match = pattern.search(text)
+            key = match.group(1)[:4] + str(i % 7)
+            counts[key] = counts.get(key, 0) + len(text.split('/'))
+        return counts
+
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter_ns()
+        workload()
+        samples.append((time.perf_counter_ns() - started) / 1000)
+    return statistics.median(samples)
+
+
+def percentile(sorted_samples, fraction):
+    index = min(len(sorted_samples) - 1, int(round(fraction * (len(sorted_samples) - 1))))
+    return sorted_samples[index]
+
+
+async def measure(corpus, iterations):
+    """
+    Per (target, shape): latency percentiles in microseconds and peak bytes
+    per call. Returns (results, calibration_us); calibration runs between
+    targets so it sees the same machine state as the timings.
+    """
+    timings = defaultdict(list)
+    peaks = defaultdict(list)
+    calibrations = []
+    for name, (func, wanted) in TARGETS.items():
+        entries = [entry for entry in corpus if wanted(entry)]
+        calibrations.append(calibrate(rounds=3))
+        gc.disable()
+        try:
+            for entry in entries:
+                await func(entry)  # warm up
+                samples = timings[(name, entry['shape'])]
+                for _ in range(iterations):
+                    started = time.perf_counter_ns()
+                    await func(entry)
+                    samples.append((time.perf_counter_ns() - started) / 1000)
+        finally:
+            gc.enable()
+
+        # Smallest of a few calls: the first ones may fill caches and intern strings
+        tracemalloc.start()
+        for entry in entries:
+            entry_peaks = []
+            for _ in range(5):
+                tracemalloc.reset_peak()
+                baseline_bytes = tracemalloc.get_traced_memory()[0]
+                await func(entry)
+                entry_peaks.append(tracemalloc.get_traced_memory()[1] - baseline_bytes)
+            peaks[(name, entry['shape'])].append(min(entry_peaks))
+        tracemalloc.stop()
+
+    results = {}
+    for key, samples in sorted(timings.items()):
+        samples.sort()
+        results[f"{key[0]}/{key[1]}"] = {
+            "min_us": round(samples[0], 2),
+            "p50_us": round(percentile(samples, 0.50), 2),
+            "p95_us": round(percentile(samples, 0.95), 2),
+            "p99_us": round(percentile(samples, 0.99), 2),
+            "peak_bytes": max(peaks[key])
+        }
+    return results, statistics.median(calibrations)
+
+
+def compare(results, calibration_us, baseline, tolerance):
+    """
+    Regressions beyond tolerance: per target, the geometric mean over shapes
+    of the calibrated best-case latency ratio (percentiles of
+    microsecond-scale calls are too noisy on shared machines to gate on),
+    and per cell, peak allocation.
+    """
+    regressions = []
+    scale = calibration_us / baseline['calibration_us']
+    log_ratios = defaultdict(list)
+    for key, base in baseline['results'].items():
+        current = results.get(key)
+        if current is None:
+            continue
+        target = key.split('/')[0]
+        log_ratios[target].append(math.log(current['min_us'] / (base['min_us'] * scale)))
+        # Small absolute slack: allocator and interning noise
+        allowed_bytes = base['peak_bytes'] * (1 + tolerance) + 1024
+        if current['peak_bytes'] > allowed_bytes:
+            regressions.append(f"{key}: peak {current['peak_bytes']}B > {allowed_bytes:.0f}B allowed")
+    for target, ratios in sorted(log_ratios.items()):
+        ratio = math.exp(sum(ratios) / len(ratios))
+        print(f"{target:<60} {ratio:>6.2f}x baseline")
+        if ratio > 1 + tolerance:
+            regressions.append(f"{target}: {ratio:.2f}x baseline")
+    return regressions
+
+
+def print_report(results, calibration_us):
+    print(f"calibration: {calibration_us:.1f}us")
+    print(f"{'target/shape':<60} {'minus':>9} {'p50us':>9} {'p95us':>9} {'p99us':>9} {'peakB':>8}")
+    for key, row in results.items():
+        print(f"{key:<60} {row['min_us']:>9.2f} {row['p50_us']:>9.2f} {row['p95_us']:>9.2f} "
+              f"{row['p99_us']:>9.2f} {row['peak_bytes']:>8}")
+
+
+async def run(args):
+    corpus = load_corpus()
+    install_stubs(corpus)
+
+    if args.record:
+        await record_expectations(corpus)
+        save_corpus(corpus)
+        print(f"Recorded expectations for {len(corpus)} entries in {CORPUS_PATH}")
+        return 0
+
+    mismatches = await check_golden(corpus)
+    for mismatch in mismatches:
+        print(f"MISMATCH {mismatch}")
+    print(f"corpus: {len(corpus)} entries, mismatches: {len(mismatches)}")
+    if mismatches:
+        return 1
+
+    results, calibration_us = await measure(corpus, args.iterations)
+    print_report(results, calibration_us)
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({"calibration_us": round(calibration_us, 2), "iterations": args.iterations,
+                       "results": results}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved to {BASELINE_PATH}")
+        return 0
+
+    if not os.path.exists(BASELINE_PATH):
+        print("No baseline yet; run with --save-baseline")
+        return 0
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(results, calibration_us, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"regressions: {len(regressions)} (tolerance {args.tolerance:.0%})")
+    return 2 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden-corpus check and benchmark for coordinate extraction")
+    parser.add_argument('--iterations', type=int, default=200, help="timed calls per corpus entry")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed slowdown before failing")
+    parser.add_argument('--save-baseline', action='store_true', help="write baseline.json from this run")
+    parser.add_argument('--record', action='store_true', help="fill in missing corpus expectations")
+    args = parser.parse_args()
+
+    # The pipeline logs every step; keep logging out of the timings
+    logging.disable(logging.CRITICAL)
+    try:
+        return asyncio.run(run(args))
+    finally:
+        bot.worker_pool.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: single-pass coordinate_parser vs the original regex cascade
+
+Usage: python benchmarks/bench_url_extractor.py [iterations]
+"""
+import logging
+import os
+import re
+import sys
+import timeit
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coordinate_parser import extract_coordinates_from_url
+
+# The legacy function logs every match; keep logging out of the timings
+logger = logging.getLogger("legacy")
+logger.disabled = True
+
+# Real URL shapes seen in messages and after short-link expansion
+CORPUS = [
+    "https://www.google.com/maps/@40.7127753,-74.0059728,15z",
+    "https://www.google.com/maps/place/Western+Wall/@31.7767191,35.2318158,17z/data=!3m1!4b1!4m6!3m5!1s0x1502d7d634c1fc4b:0xd96f623e456ee1cb!8m2!3d31.7767146!4d35.2343907!16zL20vMDFrN3Y",
+    "https://www.google.com/maps/place/Eiffel+Tower/data=!4m7!3m6!1s0x47e66e2964e34e2d:0x8ddca9ee380ef7e0!8m2!3d48.8583701!4d2.2944813!16zL20vMDJqODE",
+    "https://www.google.com/maps/dir//data=!4m6!4m5!1m1!4e2!1m2!1m1!1s0x0:0x0!3e0!1d51.5007!2d-0.1246",
+    "https://maps.google.com/maps?ll=48.858370,2.294481&z=16",
+    "https://maps.google.com/?q=31.7767,35.2343",
+    "https://www.google.com/maps/search/31.776720,+35.234390?entry=tts",
+    "https://www.google.com/maps/search/40.712776,-74.005974",
+    "https://consent.google.com/ml?continue=https://www.google.com/maps/search/31.776720,%2B35.234390?entry%3Dtts&gl=IL&m=0&pc=m&hl=en",
+    "https://consent.google.com/ml?continue=https://www.google.com/maps/place/X/data%3D!3d31.7767!4d35.2343&gl=IL",
+    "https://maps.google.com/maps?daddr=32.0853,34.7818&saddr=Current+Location",
+    "https://www.google.com/maps/place/Tel+Aviv/",
+    "https://www.google.com/maps?cid=1234567890123456789",
+]
+
+
+def legacy_extract_coordinates_from_google_maps(url):
+    """Regex cascade as it was before coordinate_parser (reference only)"""
+    import urllib.parse
+    try:
+        expanded_url = url
+        # Если это consent.google.com, ищем только в параметре continue
+        if 'consent.google.com' in expanded_url:
+            continue_match = re.search(r'continue=([^&]+)', expanded_url)
+            if continue_match:
+                continue_data = urllib.parse.unquote(continue_match.group(1))
+                # Сначала ищем паттерн с плюсом
+                match = re.search(r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)', continue_data)
+                if match:
+                    lat, lng = match.groups()
+                    logger.info(f"Found coordinates via consent continue +: {lat}, {lng}")
+                    return float(lat), float(lng)
+                # Потом обычный паттерн
+                match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', continue_data)
+                if match:
+                    lat, lng = match.groups()
+                    logger.info(f"Found coordinates via consent continue: {lat}, {lng}")
+                    return float(lat), float(lng)
+                # Ищем паттерн !3d и !4d (для place ссылок)
+                match = re.search(r'!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)', continue_data)
+                if match:
+                    lat, lng = match.groups()
+                    logger.info(f"Found coordinates via consent continue !3d!4d: {lat}, {lng}")
+                    return float(lat), float(lng)
+            return None, None
+        # Pattern for @lat,lng format
+        coords_pattern = r'@(-?\d+\.?\d*),(-?\d+\.?\d*)'
+        match = re.search(coords_pattern, expanded_url)
+        
+        if match:
+            lat, lng = match.groups()
+            logger.info(f"Found coordinates via @ pattern: {lat}, {lng}")
+            return float(lat), float(lng)
+        
+        # Pattern for @lat,lng,zoom format (with zoom level)
+        coords_zoom_pattern = r'@(-?\d+\.?\d*),(-?\d+\.?\d*),(\d+z)'
+        match = re.search(coords_zoom_pattern, expanded_url)
+        
+        if match:
+            lat, lng, zoom = match.groups()
+            logger.info(f"Found coordinates via @zoom pattern: {lat}, {lng}")
+            return float(lat), float(lng)
+        
+        # Pattern for !3d and !4d format (newer Google Maps)
+        coords_3d4d_pattern = r'!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)'
+        match = re.search(coords_3d4d_pattern, expanded_url)
+        
+        if match:
+            lat, lng = match.groups()
+            logger.info(f"Found coordinates via !3d!4d pattern: {lat}, {lng}")
+            return float(lat), float(lng)
+        
+        # Pattern for !1d and !2d format (alternative)
+        coords_1d2d_pattern = r'!1d(-?\d+\.?\d*)!2d(-?\d+\.?\d*)'
+        match = re.search(coords_1d2d_pattern, expanded_url)
+        
+        if match:
+            lat, lng = match.groups()
+            logger.info(f"Found coordinates via !1d!2d pattern: {lat}, {lng}")
+            return float(lat), float(lng)
+        
+        # Pattern for ll parameter
+        parsed_url = urlparse(expanded_url)
+        if 'll' in parsed_url.query:
+            params = parse_qs(parsed_url.query)
+            if 'll' in params:
+                coords = params['ll'][0].split(',')
+                if len(coords) == 2:
+                    logger.info(f"Found coordinates via ll parameter: {coords[0]}, {coords[1]}")
+                    return float(coords[0]), float(coords[1])
+        
+        # Pattern for q parameter with coordinates
+        if 'q' in parsed_url.query:
+            params = parse_qs(parsed_url.query)
+            if 'q' in params:
+                q_value = params['q'][0]
+                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', q_value)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    logger.info(f"Found coordinates via q parameter: {lat}, {lng}")
+                    return float(lat), float(lng)
+        
+        # Pattern for place parameter (newer Google Maps format)
+        if 'place' in parsed_url.path:
+            # Try to extract coordinates from place path
+            place_pattern = r'place/([^/]+)'
+            place_match = re.search(place_pattern, expanded_url)
+            if place_match:
+                place_data = place_match.group(1)
+                # Look for coordinates in the place data
+                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', place_data)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    logger.info(f"Found coordinates via place path: {lat}, {lng}")
+                    return float(lat), float(lng)
+        
+        # Pattern for search parameter with coordinates
+        if 'search' in parsed_url.path:
+            search_pattern = r'search/([^/]+)'
+            search_match = re.search(search_pattern, expanded_url)
+            if search_match:
+                search_data = search_match.group(1)
+                # Look for coordinates in the search data
+                coords_match = re.search(r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)', search_data)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    logger.info(f"Found coordinates via search path with +: {lat}, {lng}")
+                    return float(lat), float(lng)
+                # Also try without +
+                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', search_data)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    logger.info(f"Found coordinates via search path: {lat}, {lng}")
+                    return float(lat), float(lng)
+                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', search_data)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    logger.info(f"Found coordinates via search path: {lat}, {lng}")
+                    return float(lat), float(lng)
+        
+        # Try to extract coordinates from the entire expanded URL
+        # This is a fallback for complex URLs
+        # URL decode first to handle encoded coordinates
+        import urllib.parse
+        decoded_url = urllib.parse.unquote(expanded_url)
+        coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', decoded_url)
+        if coords_match:
+            lat, lng = coords_match.groups()
+            # Validate coordinate ranges
+            lat, lng = float(lat), float(lng)
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                logger.info(f"Found coordinates via fallback pattern: {lat}, {lng}")
+                return lat, lng
+        
+        # Try to extract coordinates from /search/ path in Google Maps URL
+        search_pattern = r'/search/(-?\d+\.?\d*),?\s*(-?\d+\.?\d*)'
+        search_match = re.search(search_pattern, expanded_url)
+        if search_match:
+            lat, lng = search_match.groups()
+            # Validate coordinate ranges
+            lat, lng = float(lat), float(lng)
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                logger.info(f"Found coordinates via search path pattern: {lat}, {lng}")
+                return lat, lng
+        
+        # Try to extract from the continue parameter in consent URLs (check this first)
+        continue_match = re.search(r'continue=([^&]+)', expanded_url)
+        if continue_match:
+            continue_data = urllib.parse.unquote(continue_match.group(1))
+            logger.info(f"Continue data: {continue_data}")
+            
+            # Look for coordinates in continue data
+            # Try different patterns for coordinates
+            coord_patterns = [
+                r'(-?\d+\.?\d*),(-?\d+\.?\d*)',  # Standard format
+                r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)',  # With plus sign
+                r'(-?\d+\.?\d*),%2B(-?\d+\.?\d*)',  # URL encoded plus
+            ]
+            
+            for pattern in coord_patterns:
+                coords_match = re.search(pattern, continue_data)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    # Validate coordinate ranges
+                    lat, lng = float(lat), float(lng)
+                    if -90 <= lat <= 90 and -180 <= lng <= 180:
+                        logger.info(f"Found coordinates via continue parameter: {lat}, {lng}")
+                        return lat, lng
+            
+            # Also try the original encoded continue data
+            original_continue = continue_match.group(1)
+            for pattern in coord_patterns:
+                coords_match = re.search(pattern, original_continue)
+                if coords_match:
+                    lat, lng = coords_match.groups()
+                    # Validate coordinate ranges
+                    lat, lng = float(lat), float(lng)
+                    if -90 <= lat <= 90 and -180 <= lng <= 180:
+                        logger.info(f"Found coordinates via original continue parameter: {lat}, {lng}")
+                        return lat, lng
+        
+        # Try to extract coordinates from search path (new pattern) - but only if it's not a consent URL
+        if 'consent.google.com' not in expanded_url:
+            search_coords_pattern = r'search/([^?]+)'
+            search_match = re.search(search_coords_pattern, expanded_url)
+            if search_match:
+                search_data = search_match.group(1)
+                # URL decode the search data first
+                import urllib.parse
+                decoded_data = urllib.parse.unquote(search_data)
+                logger.info(f"Decoded search data: {decoded_data}")
+                
+                # Try to find coordinates in decoded data with different patterns
+                coord_patterns = [
+                    r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)',  # With plus sign
+                    r'(-?\d+\.?\d*),(-?\d+\.?\d*)',   # Standard format
+                    r'(-?\d+\.?\d*),%2B(-?\d+\.?\d*)', # URL encoded plus
+                ]
+                
+                for pattern in coord_patterns:
+                    coords_match = re.search(pattern, decoded_data)
+                    if coords_match:
+                        lat, lng = coords_match.groups()
+                        # Validate coordinate ranges
+                        lat, lng = float(lat), float(lng)
+                        if -90 <= lat <= 90 and -180 <= lng <= 180:
+                            logger.info(f"Found coordinates via search path pattern: {lat}, {lng}")
+                            return lat, lng
+                
+                # Also try in the original search_data (before decoding)
+                for pattern in coord_patterns:
+                    coords_match = re.search(pattern, search_data)
+                    if coords_match:
+                        lat, lng = coords_match.groups()
+                        # Validate coordinate ranges
+                        lat, lng = float(lat), float(lng)
+                        if -90 <= lat <= 90 and -180 <= lng <= 180:
+                            logger.info(f"Found coordinates via original search data: {lat}, {lng}")
+                            return lat, lng
+        else:
+            # For consent URLs, skip search path extraction and go directly to continue parameter
+            logger.info("Skipping search path extraction for consent URL")
+            # Don't return here, continue to the next checks
+            pass
+        
+        # Try to extract coordinates from place path (modern Google Maps format)
+        place_coords_pattern = r'place/([^/]+)'
+        place_match = re.search(place_coords_pattern, expanded_url)
+        if place_match:
+            place_data = place_match.group(1)
+            # Look for coordinates in the place data
+            coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', place_data)
+            if coords_match:
+                lat, lng = coords_match.groups()
+                # Validate coordinate ranges
+                lat, lng = float(lat), float(lng)
+                if -90 <= lat <= 90 and -180 <= lng <= 180:
+                    logger.info(f"Found coordinates via place path: {lat}, {lng}")
+                    return lat, lng
+        
+        # Try to extract from complex query parameters
+        # Look for coordinates in various parameter formats
+        for param_name in ['q', 'll', 'sll', 'daddr']:
+            if param_name in parsed_url.query:
+                params = parse_qs(parsed_url.query)
+                if param_name in params:
+                    param_value = params[param_name][0]
+                    # Try to find coordinates in parameter value
+                    coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', param_value)
+                    if coords_match:
+                        lat, lng = coords_match.groups()
+                        lat, lng = float(lat), float(lng)
+                        if -90 <= lat <= 90 and -180 <= lng <= 180:
+                            return lat, lng
+        
+        # Try to extract from path segments
+        path_segments = parsed_url.path.split('/')
+        for segment in path_segments:
+            coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', segment)
+            if coords_match:
+                lat, lng = coords_match.groups()
+                lat, lng = float(lat), float(lng)
+                if -90 <= lat <= 90 and -180 <= lng <= 180:
+                    return lat, lng
+        
+        return None, None
+    except Exception as e:
+        logger.error(f"Error extracting coordinates: {e}")
+        return None, None
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    mismatches = 0
+    for url in CORPUS:
+        old = legacy_extract_coordinates_from_google_maps(url)
+        new = extract_coordinates_from_url(url)
+        if old != new:
+            mismatches += 1
+            print(f"MISMATCH {url}\n  legacy={old} new={new}")
+
+    legacy_time = timeit.timeit(
+        lambda: [legacy_extract_coordinates_from_google_maps(u) for u in CORPUS], number=iterations)
+    new_time = timeit.timeit(
+        lambda: [extract_coordinates_from_url(u) for u in CORPUS], number=iterations)
+
+    calls = iterations * len(CORPUS)
+    print(f"URLs: {len(CORPUS)}, iterations: {iterations}, mismatches: {mismatches}")
+    print(f"legacy cascade: {legacy_time / calls * 1e6:8.2f} us/url")
+    print(f"single pass:    {new_time / calls * 1e6:8.2f} us/url")
+    print(f"speedup:        {legacy_time / new_time:8.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
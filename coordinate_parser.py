@@ -0,0 +1,346 @@
+# -*- coding: utf-8 -*-
+"""
+Coordinate parsing for Maps to Waze Bot
+Single-pass extraction of coordinates from Google Maps URLs
+"""
+
+import re
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, unquote_plus, urlsplit
+
+# Number as accepted by the bot: optional minus, digits, optional fraction
+_NUMBER = r'-?\d+\.?\d*'
+
+# Precompiled patterns (compiled once at import instead of on every call)
+_PAIR_RE = re.compile(rf'({_NUMBER}),({_NUMBER})')
+_PAIR_PLUS_RE = re.compile(rf'({_NUMBER}),\+({_NUMBER})')
+_PAIR_ENCODED_PLUS_RE = re.compile(rf'({_NUMBER}),%2B({_NUMBER})')
+_SEARCH_PATH_RE = re.compile(rf'/search/({_NUMBER}),?\s*({_NUMBER})')
+_CONTINUE_RE = re.compile(r'continue=([^&]+)')
+_PLACE_SEGMENT_RE = re.compile(r'place/([^/]+)')
+_SEARCH_SEGMENT_RE = re.compile(r'search/([^/]+)')
+_SEARCH_QUERY_RE = re.compile(r'search/([^?]+)')
+_DATA_3D4D_RE = re.compile(rf'!3d({_NUMBER})!4d({_NUMBER})')
+
+# One alternation for all marker shapes: @lat,lng | !3d..!4d.. | !1d..!2d..
+_MARKER_RE = re.compile(
+    rf'@({_NUMBER}),({_NUMBER})'
+    rf'|!3d({_NUMBER})!4d({_NUMBER})'
+    rf'|!1d({_NUMBER})!2d({_NUMBER})'
+)
+_MARKER_SHAPES = ('@ pattern', '!3d!4d pattern', '!1d!2d pattern')
+
+# data= parameter chain: !<field><type><value> tokens; an m token opens a
+# message holding the next <value> tokens
+_DATA_CHAIN_RE = re.compile(r'data=((?:![^!/?&#]*)+)')
+_DATA_TOKEN_RE = re.compile(r'!(\d+)([a-z])([^!]*)')
+_FEATURE_ID_RE = re.compile(r'^0x[0-9a-fA-F]+:0x([0-9a-fA-F]+)$')
+_PLACE_ID_PARAM_RE = re.compile(r'[?&](?:query_)?place_id=([A-Za-z0-9_-]+)')
+_FTID_PARAM_RE = re.compile(r'[?&]ftid=(0x[0-9a-fA-F]+:0x[0-9a-fA-F]+)')
+_CID_PARAM_RE = re.compile(r'[?&]cid=(\d+)')
+
+# Pair patterns tried on continue= and /search/ data, in legacy order
+_CONTINUE_PAIR_PATTERNS = (_PAIR_RE, _PAIR_PLUS_RE, _PAIR_ENCODED_PLUS_RE)
+_SEARCH_PAIR_PATTERNS = (_PAIR_PLUS_RE, _PAIR_RE, _PAIR_ENCODED_PLUS_RE)
+
+Coordinates = Tuple[Optional[float], Optional[float]]
+
+# What a Maps URL says about its place without any API call: pin location,
+# Places API place id (ChIJ...), feature id (0x..:0x..), CID and name
+MapsData = namedtuple('MapsData', ['lat', 'lng', 'place_id', 'feature_id', 'cid', 'name'])
+
+
+def is_valid_coordinates(lat: float, lng: float) -> bool:
+    """Check that latitude and longitude are within valid ranges"""
+    return -90 <= lat <= 90 and -180 <= lng <= 180
+
+
+class UrlParts:
+    """URL tokenized once into path, query params and decoded form"""
+
+    __slots__ = ('url', '_split', '_params', '_decoded')
+
+    def __init__(self, url: str):
+        self.url = url
+        self._split = None
+        self._params = None
+        self._decoded = None
+
+    # Every part is computed on first use and at most once
+
+    @property
+    def path(self) -> str:
+        if self._split is None:
+            self._split = urlsplit(self.url)
+        return self._split.path
+
+    @property
+    def params(self) -> Dict[str, List[str]]:
+        if self._params is None:
+            if self._split is None:
+                self._split = urlsplit(self.url)
+            query = self._split.query
+            self._params = parse_qs(query) if query else {}
+        return self._params
+
+    @property
+    def decoded(self) -> str:
+        if self._decoded is None:
+            self._decoded = unquote(self.url)
+        return self._decoded
+
+
+def _first_pair(patterns, text: str, validate: bool = True) -> Coordinates:
+    """Return the first pair matched by patterns (in order) in text"""
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            lat, lng = float(match.group(1)), float(match.group(2))
+            if not validate or is_valid_coordinates(lat, lng):
+                return lat, lng
+    return None, None
+
+
+def _scan_markers(url: str) -> Tuple[Optional[Tuple[str, str]], Optional[str]]:
+    """Best of @lat,lng, !3d!4d and !1d!2d blocks, found in a single scan"""
+    found = [None, None]
+    for match in _MARKER_RE.finditer(url):
+        last = match.lastindex
+        # @lat,lng has the highest priority, nothing else matters
+        if last == 2:
+            return match.group(1, 2), _MARKER_SHAPES[0]
+        index = (last >> 1) - 2
+        if found[index] is None:
+            found[index] = match.group(last - 1, last)
+    for index, pair in enumerate(found):
+        if pair is not None:
+            return pair, _MARKER_SHAPES[index + 1]
+    return None, None
+
+
+def _extract_from_consent(url: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """consent.google.com redirects carry the real URL in continue="""
+    continue_match = _CONTINUE_RE.search(url)
+    if continue_match:
+        continue_data = unquote(continue_match.group(1))
+        for pattern, shape in ((_PAIR_PLUS_RE, 'consent continue +'),
+                               (_PAIR_RE, 'consent continue'),
+                               (_DATA_3D4D_RE, 'consent continue !3d!4d')):
+            match = pattern.search(continue_data)
+            if match:
+                return float(match.group(1)), float(match.group(2)), shape
+    return None, None, None
+
+
+def _parse_data_chain(chain: str) -> Tuple[Coordinates, Optional[str], Optional[str]]:
+    """
+    Walk the tokens of a data= chain keeping track of the enclosing
+    messages. Returns (location, place id, feature id): the location is
+    the 3d/4d pair of the place pin (an 8m message) if there is one, else
+    the first 3d/4d pair, else the first 1d/2d pair. 3d/4d is lat/lng, but
+    waypoints (!2m2!1d<lng>!2d<lat>) put the longitude first.
+    """
+    open_messages: List[List] = []  # [field, tokens left]
+    pin = [None, None]
+    first_pair = [None, None]
+    waypoint = [None, None]
+    place_id = feature_id = None
+    for field, kind, value in _DATA_TOKEN_RE.findall(chain):
+        parent = open_messages[-1][0] if open_messages else None
+        # This token uses up one slot of every enclosing message
+        for message in open_messages:
+            message[1] -= 1
+        while open_messages and open_messages[-1][1] < 0:
+            open_messages.pop()
+
+        if kind == 'm':
+            size = int(value) if value.isdigit() else 0
+            if size:
+                open_messages.append([field, size])
+        elif kind == 'd' and field in ('3', '4', '1', '2'):
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            if field in ('3', '4'):
+                index = 0 if field == '3' else 1
+                if parent == '8':
+                    pin[index] = number
+                elif first_pair[index] is None and (index == 0 or first_pair[0] is not None):
+                    first_pair[index] = number
+            else:
+                index = 1 if field == '1' else 0
+                if waypoint[index] is None and (index == 1 or waypoint[1] is not None):
+                    waypoint[index] = number
+        elif kind == 's':
+            if feature_id is None and _FEATURE_ID_RE.match(value):
+                feature_id = value
+            elif place_id is None and value.startswith('ChIJ'):
+                place_id = value
+        while open_messages and open_messages[-1][1] == 0:
+            open_messages.pop()
+
+    for lat, lng in (pin, first_pair, waypoint):
+        if lat is not None and lng is not None and is_valid_coordinates(lat, lng):
+            return (lat, lng), place_id, feature_id
+    return (None, None), place_id, feature_id
+
+
+def decode_maps_data(url: str) -> MapsData:
+    """
+    Everything a Google Maps URL encodes about its place: the pin location,
+    place id and feature id from the data= chain (also percent-encoded or
+    inside a consent continue=), the place_id/ftid/cid parameters and the
+    /place/ name. Fields the URL does not carry are None.
+    """
+    if 'continue=' in url:
+        continue_match = _CONTINUE_RE.search(url)
+        if continue_match:
+            url = unquote(continue_match.group(1))
+    if '%21' in url or '%3D' in url or '%3d' in url:
+        url = unquote(url)
+
+    (lat, lng), place_id, feature_id = (None, None), None, None
+    chain_match = _DATA_CHAIN_RE.search(url)
+    if chain_match:
+        (lat, lng), place_id, feature_id = _parse_data_chain(chain_match.group(1))
+
+    if place_id is None:
+        match = _PLACE_ID_PARAM_RE.search(url)
+        place_id = match.group(1) if match else None
+    if feature_id is None:
+        match = _FTID_PARAM_RE.search(url)
+        feature_id = match.group(1) if match else None
+    if feature_id is not None and _FEATURE_ID_RE.match(feature_id).group(1).strip('0') == '':
+        # 0x0:0x0 is a placeholder (directions), not a place
+        feature_id = None
+    cid = None
+    if feature_id is not None:
+        # The second half of a feature id is the place's CID
+        cid = str(int(_FEATURE_ID_RE.match(feature_id).group(1), 16))
+    else:
+        match = _CID_PARAM_RE.search(url)
+        cid = match.group(1) if match else None
+
+    name = None
+    place_match = _PLACE_SEGMENT_RE.search(url)
+    if place_match and not place_match.group(1).startswith(('@', 'data=')):
+        name = unquote_plus(place_match.group(1)) or None
+    return MapsData(lat, lng, place_id, feature_id, cid, name)
+
+
+def extract_coordinates_with_shape(url: str) -> Tuple[Optional[float], Optional[float], Optional[str]]:
+    """
+    Extract coordinates from Google Maps URL in one pass.
+
+    Returns (lat, lng, shape) where shape names the matched URL form,
+    or (None, None, None). Priority order is the same as the original
+    regex cascade: markers, ll, q, /place/, /search/, decoded fallback,
+    then continue=, params and path segments with range validation.
+    """
+    if 'consent.google.com' in url:
+        return _extract_from_consent(url)
+
+    # @lat,lng, !3d!4d and !1d!2d data blocks
+    pair, shape = _scan_markers(url)
+    if pair is not None:
+        return float(pair[0]), float(pair[1]), shape
+
+    # Percent-encoded data= chain (%213d..%214d..)
+    if '%21' in url and 'data' in url:
+        decoded = decode_maps_data(url)
+        if decoded.lat is not None:
+            return decoded.lat, decoded.lng, 'data chain'
+
+    # Every remaining shape needs a separator between lat and lng; without
+    # one only the lenient /search/ form can match, so skip the full scans
+    if ',' not in url and '%2C' not in url and '%2c' not in url:
+        search_match = _SEARCH_PATH_RE.search(url) if '/search/' in url else None
+        if search_match:
+            lat, lng = float(search_match.group(1)), float(search_match.group(2))
+            if is_valid_coordinates(lat, lng):
+                return lat, lng, 'search path pattern'
+        return None, None, None
+
+    parts = UrlParts(url)
+    params = parts.params
+    if 'll' in params:
+        coords = params['ll'][0].split(',')
+        if len(coords) == 2:
+            try:
+                return float(coords[0]), float(coords[1]), 'll parameter'
+            except ValueError:
+                pass
+
+    if 'q' in params:
+        lat, lng = _first_pair((_PAIR_RE,), params['q'][0], validate=False)
+        if lat is not None:
+            return lat, lng, 'q parameter'
+
+    if 'place' in parts.path:
+        place_match = _PLACE_SEGMENT_RE.search(url)
+        if place_match:
+            lat, lng = _first_pair((_PAIR_RE,), place_match.group(1), validate=False)
+            if lat is not None:
+                return lat, lng, 'place path'
+
+    if 'search' in parts.path:
+        search_match = _SEARCH_SEGMENT_RE.search(url)
+        if search_match:
+            lat, lng = _first_pair((_PAIR_PLUS_RE, _PAIR_RE), search_match.group(1), validate=False)
+            if lat is not None:
+                return lat, lng, 'search path'
+
+    # Fallback for complex URLs: first pair anywhere in the decoded URL
+    match = _PAIR_RE.search(parts.decoded)
+    if match:
+        lat, lng = float(match.group(1)), float(match.group(2))
+        if is_valid_coordinates(lat, lng):
+            return lat, lng, 'fallback pattern'
+
+    # Cold path: look for a valid pair in specific parts of the URL
+    search_match = _SEARCH_PATH_RE.search(url)
+    if search_match:
+        lat, lng = float(search_match.group(1)), float(search_match.group(2))
+        if is_valid_coordinates(lat, lng):
+            return lat, lng, 'search path pattern'
+
+    continue_match = _CONTINUE_RE.search(url)
+    if continue_match:
+        for data in (unquote(continue_match.group(1)), continue_match.group(1)):
+            lat, lng = _first_pair(_CONTINUE_PAIR_PATTERNS, data)
+            if lat is not None:
+                return lat, lng, 'continue parameter'
+
+    search_match = _SEARCH_QUERY_RE.search(url)
+    if search_match:
+        for data in (unquote(search_match.group(1)), search_match.group(1)):
+            lat, lng = _first_pair(_SEARCH_PAIR_PATTERNS, data)
+            if lat is not None:
+                return lat, lng, 'search path pattern'
+
+    place_match = _PLACE_SEGMENT_RE.search(url)
+    if place_match:
+        lat, lng = _first_pair((_PAIR_RE,), place_match.group(1))
+        if lat is not None:
+            return lat, lng, 'place path'
+
+    for param_name in ('q', 'll', 'sll', 'daddr'):
+        if param_name in params:
+            lat, lng = _first_pair((_PAIR_RE,), params[param_name][0])
+            if lat is not None:
+                return lat, lng, f'{param_name} parameter'
+
+    for segment in parts.path.split('/'):
+        lat, lng = _first_pair((_PAIR_RE,), segment)
+        if lat is not None:
+            return lat, lng, 'path segment'
+
+    return None, None, None
+
+
+def extract_coordinates_from_url(url: str) -> Coordinates:
+    """Extract latitude and longitude from Google Maps URL"""
+    lat, lng, _ = extract_coordinates_with_shape(url)
+    return lat, lng
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Update deduplication for Maps to Waze Bot
+O(1) check-and-insert with amortized expiry and a hard memory cap
+"""
+
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+
+class Deduplicator:
+    """Remember keys for `window` seconds; insertion order doubles as expiry order"""
+
+    def __init__(self, window: float = 300, max_size: int = 10000):
+        self.window = window
+        self.max_size = max_size
+        self._seen = OrderedDict()  # key -> monotonic timestamp, oldest first
+        self.duplicates = 0
+
+    def seen(self, key: Hashable) -> bool:
+        """Return True if key was seen within the window, otherwise record it"""
+        now = time.monotonic()
+        self._expire(now)
+        if key in self._seen:
+            self.duplicates += 1
+            return True
+        self._seen[key] = now
+        if len(self._seen) > self.max_size:
+            self._seen.popitem(last=False)
+        return False
+
+    def _expire(self, now: float):
+        """Drop expired keys from the old end; each key is dropped once"""
+        cutoff = now - self.window
+        seen = self._seen
+        while seen:
+            key, timestamp = next(iter(seen.items()))
+            if timestamp > cutoff:
+                break
+            seen.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+# Shared by /start, messages and button callbacks
+update_deduplicator = Deduplicator()
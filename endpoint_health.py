@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Endpoint health for Maps to Waze Bot
+Adaptive timeouts from recent latency and circuit breakers per outbound endpoint
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from worker_pool import PoolBusyError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(PoolBusyError):
+    """Raised when an endpoint's breaker is open; like a busy pool, the miss is not cached"""
+
+
+class Endpoint:
+    """
+    Recent latencies and a circuit breaker for one host or API.
+
+    The timeout is `factor` times the p95 of the last `window` calls,
+    clamped to [min_timeout, max_timeout]; until `min_samples` calls have
+    been seen it is max_timeout. Failed calls count with the time they
+    took, so a slowdown raises p95 instead of hiding behind timeouts.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    calls are refused for `cool_off` seconds. Then one probe call is let
+    through with max_timeout: success closes the breaker, failure opens
+    it for another cool-off. A probe that never reports back (cancelled)
+    is replaced after another cool-off. Shared by the event loop and
+    worker threads.
+    """
+
+    def __init__(self, name: str, max_timeout: float, min_timeout: float = 0.25, factor: float = 3.0,
+                 window: int = 100, min_samples: int = 20, failure_threshold: int = 5, cool_off: float = 30.0):
+        self.name = name
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.factor = factor
+        self.min_samples = min_samples
+        self.failure_threshold = failure_threshold
+        self.cool_off = cool_off
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self._new_samples = 0
+        self._p95: Optional[float] = None
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.refused = 0
+        self.opened = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; an open breaker lets one probe through after the cool-off"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == OPEN and now - self._opened_at >= self.cool_off:
+                self.state = HALF_OPEN
+                self._probe_started = None
+            if self.state == HALF_OPEN and (self._probe_started is None or
+                                            now - self._probe_started >= self.cool_off):
+                self._probe_started = now
+                return True
+            self.refused += 1
+            return False
+
+    def guard(self):
+        """allow() or raise CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit open for {self.name}")
+
+    def timeout(self) -> float:
+        """Timeout for the next call, in seconds"""
+        with self._lock:
+            if self.state != CLOSED or self._p95 is None:
+                return self.max_timeout
+            return min(self.max_timeout, max(self.min_timeout, self._p95 * self.factor))
+
+    @property
+    def p95(self) -> Optional[float]:
+        """p95 latency of recent calls in seconds, None until min_samples calls were seen"""
+        return self._p95
+
+    def record_success(self, seconds: float):
+        with self._lock:
+            self._observe(seconds)
+            self.successes += 1
+            self.consecutive_failures = 0
+            if self.state != CLOSED:
+                logger.info(f"Circuit for {self.name} closed")
+                self.state = CLOSED
+
+    def record_failure(self, seconds: float):
+        with self._lock:
+            self._observe(seconds)
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or (
+                    self.state == CLOSED and self.consecutive_failures >= self.failure_threshold):
+                logger.warning(f"Circuit for {self.name} opened after {self.consecutive_failures} failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self.opened += 1
+
+    def _observe(self, seconds: float):
+        self._latencies.append(seconds)
+        self._new_samples += 1
+        # Sorting the window on every call is wasted work; p95 moves slowly
+        if len(self._latencies) >= self.min_samples and (self._p95 is None or self._new_samples >= 10):
+            ordered = sorted(self._latencies)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            self._new_samples = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        timeout = self.timeout()
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.cool_off - (time.monotonic() - self._opened_at)), 1)
+            return {
+                "state": self.state,
+                "timeout_ms": round(timeout * 1000),
+                "p95_ms": round(self._p95 * 1000, 1) if self._p95 is not None else None,
+                "samples": len(self._latencies),
+                "consecutive_failures": self.consecutive_failures,
+                "successes": self.successes,
+                "failures": self.failures,
+                "refused": self.refused,
+                "opened": self.opened,
+                "retry_in_seconds": retry_in
+            }
+
+
+class EndpointHealth:
+    """Endpoints by name (a host or an API); names beyond max_endpoints share one 'other' endpoint"""
+
+    def __init__(self, factor: float = 3.0, min_timeout: float = 0.25, failure_threshold: int = 5,
+                 cool_off: float = 30.0, max_endpoints: int = 64):
+        self.factor = factor
+        self.min_timeout = min_timeout
+        self.failure_threshold = failure_threshold
+        self.cool_off = cool_off
+        self.max_endpoints = max_endpoints
+        self._lock = threading.Lock()
+        self._endpoints: Dict[str, Endpoint] = {}
+
+    def endpoint(self, name: str, max_timeout: float) -> Endpoint:
+        """The endpoint for name, created on first use with max_timeout as its ceiling"""
+        endpoint = self._endpoints.get(name)
+        if endpoint is not None:
+            return endpoint
+        with self._lock:
+            if name not in self._endpoints and len(self._endpoints) >= self.max_endpoints:
+                name = 'other'
+            endpoint = self._endpoints.get(name)
+            if endpoint is None:
+                endpoint = self._endpoints[name] = Endpoint(
+                    name, max_timeout, min_timeout=self.min_timeout, factor=self.factor,
+                    failure_threshold=self.failure_threshold, cool_off=self.cool_off)
+            return endpoint
+
+    def open_circuits(self) -> int:
+        return sum(1 for endpoint in list(self._endpoints.values()) if endpoint.state != CLOSED)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {name: endpoint.get_stats() for name, endpoint in sorted(list(self._endpoints.items()))}
+
+
+# Process-wide endpoint health shared by the short URL expander and the Places client
+endpoint_health = EndpointHealth(
+    factor=float(os.getenv('ADAPTIVE_TIMEOUT_FACTOR', 3)),
+    min_timeout=float(os.getenv('ADAPTIVE_TIMEOUT_MIN', 0.25)),
+    failure_threshold=int(os.getenv('BREAKER_FAILURES', 5)),
+    cool_off=float(os.getenv('BREAKER_COOL_OFF', 30)))
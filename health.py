@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Health probes for Maps to Waze Bot
+Liveness and readiness built from named checks of real component state
+"""
+
+import logging
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A check returns (ok, detail); detail is reported as-is in the probe body
+CheckResult = Tuple[bool, Any]
+Check = Callable[[], CheckResult]
+
+
+class HealthMonitor:
+    """Named liveness and readiness checks, evaluated on each probe"""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self._liveness_checks: Dict[str, Check] = {}
+        self._readiness_checks: Dict[str, Check] = {}
+
+    def add_liveness_check(self, name: str, check: Check):
+        """Failing liveness means the process should be restarted"""
+        self._liveness_checks[name] = check
+
+    def add_readiness_check(self, name: str, check: Check):
+        """Failing readiness means the instance should not get traffic right now"""
+        self._readiness_checks[name] = check
+
+    @property
+    def uptime(self) -> float:
+        return time.monotonic() - self.started
+
+    def liveness(self) -> Tuple[bool, Dict[str, Any]]:
+        return self._run(self._liveness_checks)
+
+    def readiness(self) -> Tuple[bool, Dict[str, Any]]:
+        """Not ready until checks are registered (the bot has not started, e.g. no token)"""
+        if not self._readiness_checks:
+            return False, {"ok": False, "uptime_seconds": round(self.uptime, 1), "checks": {},
+                           "detail": "no readiness checks registered"}
+        return self._run(self._readiness_checks)
+
+    def _run(self, checks: Dict[str, Check]) -> Tuple[bool, Dict[str, Any]]:
+        results = {}
+        healthy = True
+        for name, check in checks.items():
+            try:
+                ok, detail = check()
+            except Exception as e:
+                logger.warning(f"Health check {name} failed: {e}")
+                ok, detail = False, f"error: {e}"
+            results[name] = {"ok": ok, "detail": detail}
+            healthy = healthy and ok
+        return healthy, {"ok": healthy, "uptime_seconds": round(self.uptime, 1), "checks": results}
+
+
+def age_check(last_success: Callable[[], Optional[float]], max_age: float,
+              monitor: HealthMonitor, startup_grace: bool = False) -> Check:
+    """
+    Check that last_success() (a monotonic timestamp, or None) is recent.
+    With startup_grace the uptime counts as the age before the first
+    success, so a fresh instance gets max_age to come up; without it the
+    check fails until the first success.
+    """
+    def check() -> CheckResult:
+        last = last_success()
+        if last is None:
+            ok = startup_grace and monitor.uptime <= max_age
+            return ok, {"age_seconds": None, "max_age_seconds": max_age}
+        age = time.monotonic() - last
+        return age <= max_age, {"age_seconds": round(age, 1), "max_age_seconds": max_age}
+    return check
+
+
+# Process-wide health monitor; the bot registers its checks at startup
+health_monitor = HealthMonitor()
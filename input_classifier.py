@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Input classifier for Maps to Waze Bot
+One scan of a message labels each location in it, so each goes straight to its resolver
+"""
+
+import re
+from collections import namedtuple
+from typing import Optional, Tuple
+
+DECIMAL = 'decimal'
+DMS = 'dms'
+MAPS_URL = 'maps_url'
+SHORT_URL = 'short_url'
+OTHER_MAP_URL = 'other_map_url'
+NOT_LOCATION = 'not_location'
+
+# Kinds that need a network round trip to resolve
+NETWORK_KINDS = frozenset({SHORT_URL})
+
+_URL_ALTERNATIVES = (
+    r'(?P<short_url>(?:https?://)?maps\.app\.goo\.gl/[^\s]+)'
+    r'|(?P<maps_url>(?i:(?:https?://)?(?:www\.)?(?:maps\.google\.com|google\.com/maps|consent\.google\.com))[^\s]*)'
+    r'|(?P<other_map_url>(?i:https?://(?:maps\.apple\.com|(?:www\.)?openstreetmap\.org|(?:www\.)?osm\.org'
+    r'|(?:www\.|ul\.)?waze\.com|(?:www\.)?bing\.com/maps|yandex\.[a-z]+/maps))[^\s]*)'
+)
+_DMS_ALTERNATIVE = r'(?P<dms>\d+°\d+\'[\d.]+"[NSEW]\s*\d+°\d+\'[\d.]+"[NSEW])'
+_DECIMAL_ALTERNATIVE = r'(?P<decimal>-?\d+\.?\d*,\s*-?\d+\.?\d*)'
+
+# One alternation, tried left to right at each position: URLs consume their
+# text, so coordinates inside a URL are not reported again as a decimal pair.
+# The lookahead skips positions where no alternative can start
+LOCATION_SCAN = re.compile(
+    r'(?=[-\dhHwWmMgGcC])(?:' + '|'.join((_URL_ALTERNATIVES, _DMS_ALTERNATIVE, _DECIMAL_ALTERNATIVE)) + ')')
+# Subsets for messages that cannot hold a URL (no slash) or DMS (no degree sign)
+COORDINATE_SCAN = re.compile(_DMS_ALTERNATIVE + '|' + _DECIMAL_ALTERNATIVE)
+DECIMAL_SCAN = re.compile(_DECIMAL_ALTERNATIVE)
+
+# Coordinates in Apple Maps, OpenStreetMap, Waze and similar URLs
+OTHER_MAP_COORDINATE_PATTERNS = (
+    re.compile(r'[?&](?:ll|sll|q|daddr|coordinate|center)=(-?\d+\.\d+)(?:,|%2C)\s*(-?\d+\.\d+)', re.IGNORECASE),
+    re.compile(r'[?&]mlat=(-?\d+\.\d+)&mlon=(-?\d+\.\d+)', re.IGNORECASE),
+    re.compile(r'#map=\d+/(-?\d+\.\d+)/(-?\d+\.\d+)'),
+    re.compile(r'(-?\d+\.\d+)(?:,|%2C)\s*(-?\d+\.\d+)', re.IGNORECASE),
+)
+
+Classification = namedtuple('Classification', ['label', 'candidates', 'needs_network'])
+
+NO_LOCATION = Classification(NOT_LOCATION, [], False)
+
+
+def classify_message(text: str, limit: Optional[int] = None) -> Classification:
+    """
+    Label a message and list its locations as (kind, source) in order of
+    appearance. The label is the kind of the first location, or
+    NOT_LOCATION; needs_network tells whether any of them has to be
+    resolved over the network.
+    
+    Substring checks pick the smallest scan that can match, so chatter
+    without a comma, slash or degree sign is rejected without a regex.
+    A bare Maps host without a path holds no location and is not matched.
+    """
+    if '/' in text or 'google.com' in text:
+        scan = LOCATION_SCAN
+    elif '°' in text:
+        scan = COORDINATE_SCAN
+    elif ',' in text:
+        scan = DECIMAL_SCAN
+    else:
+        return NO_LOCATION
+    candidates = []
+    seen = set()
+    needs_network = False
+    for match in scan.finditer(text):
+        kind = match.lastgroup
+        source = match.group(0)
+        if kind == DECIMAL and not _in_range(source):
+            continue
+        if source not in seen:
+            seen.add(source)
+            candidates.append((kind, source))
+            needs_network = needs_network or kind in NETWORK_KINDS
+            if limit is not None and len(candidates) >= limit:
+                break
+    if not candidates:
+        return NO_LOCATION
+    return Classification(candidates[0][0], candidates, needs_network)
+
+
+def _in_range(pair: str) -> bool:
+    lat, _, lng = pair.partition(',')
+    try:
+        return -90 <= float(lat) <= 90 and -180 <= float(lng) <= 180
+    except ValueError:
+        return False
+
+
+def parse_other_map_url(url: str) -> Tuple[Optional[float], Optional[float]]:
+    """Coordinates from an Apple Maps, OpenStreetMap, Waze or similar URL"""
+    for pattern in OTHER_MAP_COORDINATE_PATTERNS:
+        match = pattern.search(url)
+        if match:
+            lat, lng = float(match.group(1)), float(match.group(2))
+            if -90 <= lat <= 90 and -180 <= lng <= 180:
+                return lat, lng
+    return None, None
@@ -1,18 +1,55 @@
 import os
 import re
+import asyncio
 import logging
 import threading
 import requests
 import json
 import urllib.parse
 import time
-from urllib.parse import parse_qs, urlparse
+import random
+import hashlib
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes
 from http.server import HTTPServer, BaseHTTPRequestHandler
 
 # Import translations
-from translations import get_text, get_button_text, get_language_name, is_valid_language, LANGUAGES
+from translations import get_text, get_button_text, get_language_name, is_valid_language, validate_translations, LANGUAGES
+
+# Import coordinate parsing and short URL expansion
+from coordinate_parser import extract_coordinates_with_shape, decode_maps_data
+from url_expander import short_url_expander, DEFAULT_HEADERS
+from resolution_cache import resolution_cache, normalize_short_url, CachedResolution
+from resolution_context import ResolutionContext, UNSET, resolution_stats
+
+# Hedged racing of resolution strategies
+from strategy_race import race, Strategy, strategy_stats, valid_location
+
+# One-pass message classification and per-kind dispatch
+from input_classifier import (classify_message, parse_other_map_url, NETWORK_KINDS, NOT_LOCATION,
+                              DMS, MAPS_URL, SHORT_URL, OTHER_MAP_URL)
+
+# Import worker pool for blocking resolution calls
+from worker_pool import worker_pool, PoolBusyError
+
+# Import async web server for webhook mode
+from web_server import WebServer
+
+# Per-chat ordered, cross-chat concurrent update processing
+from update_processor import ChatOrderedUpdateProcessor
+
+# Import user preferences store
+from preferences import preferences_store
+
+# Track processed updates to prevent duplicates
+from dedup import update_deduplicator
+
+# Import metrics for the /metrics endpoint
+import metrics
+from metrics import stage_latency, InstrumentedRequest
+
+# Import liveness/readiness probes
+from health import health_monitor, age_check
 
 # Import analytics
 try:
@@ -22,21 +59,71 @@ except ImportError:
     ANALYTICS_AVAILABLE = False
     analytics = None
 
+# Handlers record analytics through the non-blocking sink; the legacy
+# analytics module (if installed) is fed from the sink's writer thread
+from analytics_sink import analytics_sink
+analytics_sink.forward_to = analytics
 
+# Dashboard statistics, updated from each batch the sink writes
+from analytics_aggregates import analytics_aggregates
+analytics_sink.add_listener(analytics_aggregates.apply_batch)
 
-# Google Maps API
-try:
-    import googlemaps
-    GOOGLE_MAPS_API_AVAILABLE = True
-except ImportError:
-    GOOGLE_MAPS_API_AVAILABLE = False
-    googlemaps = None
+# Days of stored analytics events replayed into the aggregates at startup
+ANALYTICS_REPLAY_DAYS = float(os.getenv('ANALYTICS_REPLAY_DAYS', 30))
+
+
+# Google Maps API (shared client with response caches)
+from places_client import places_client, GOOGLE_MAPS_API_AVAILABLE
+
+# Per-user and per-chat message limits; global budget for short link fetches and API calls
+from rate_limit import user_limiter, chat_limiter, outbound_budget, OutboundBudgetExhausted
+places_client.budget = outbound_budget
+
+# Adaptive timeouts and circuit breakers per outbound host and API
+from endpoint_health import endpoint_health, CircuitOpenError
+
+# Overall time budget for resolving one message, in seconds
+RESOLUTION_DEADLINE = float(os.getenv('RESOLUTION_DEADLINE', 10))
+
+# Hedged strategies: seconds before a second expansion request goes out, and
+# before text search joins a place ID API call that has not answered yet (at
+# least the place API's measured p95, since a losing API call is still billed)
+EXPAND_HEDGE_DELAY = float(os.getenv('EXPAND_HEDGE_DELAY', 0.5))
+TEXT_SEARCH_HEDGE_DELAY = float(os.getenv('TEXT_SEARCH_HEDGE_DELAY', 1.0))
+
+# Webhook mode: bounded update queue
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', 1000))
+
+# Updates processed concurrently across chats (one at a time within a chat),
+# and updates a single chat may have waiting before new ones are dropped
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', 64))
+CHAT_BACKLOG_LIMIT = int(os.getenv('CHAT_BACKLOG_LIMIT', 100))
+update_processor = ChatOrderedUpdateProcessor(UPDATE_CONCURRENCY, max_chat_backlog=CHAT_BACKLOG_LIMIT)
+
+# Async web server (webhook mode only)
+web_server = None
+
+# Readiness: max seconds since the last successful getUpdates (polling mode).
+# Liveness allows a longer gap before the instance counts as stuck
+HEALTH_MAX_POLL_AGE = float(os.getenv('HEALTH_MAX_POLL_AGE', 60))
+HEALTH_LIVENESS_POLL_AGE = float(os.getenv('HEALTH_LIVENESS_POLL_AGE', 300))
 
 # Admin panel settings
 ADMIN_USER_IDS = os.getenv('ADMIN_USER_IDS', '').split(',')  # Comma-separated list of admin Telegram user IDs
 
-# Track processed messages to prevent duplicates
-processed_messages = set()
+# Short Google Maps link inside a message
+SHORT_URL_PATTERN = re.compile(r'(?:https?://)?maps\.app\.goo\.gl/[^\s]+')
+
+# Other location shapes inside a message
+DMS_PAIR_PATTERN = re.compile(r'(\d+)°(\d+)\'([\d.]+)"([NSEW])\s*(\d+)°(\d+)\'([\d.]+)"([NSEW])')
+DECIMAL_PAIR_PATTERN = re.compile(r'(-?\d+\.?\d*),\s*(-?\d+\.?\d*)')
+
+# Upper bound on locations resolved from one message
+MAX_LOCATIONS_PER_MESSAGE = int(os.getenv('MAX_LOCATIONS_PER_MESSAGE', 10))
+
+# Shared HTTP session for blocking expansion (connection reuse)
+http_session = requests.Session()
+http_session.headers.update(DEFAULT_HEADERS)
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -50,9 +137,8 @@ def dms_to_decimal(degrees, minutes, seconds, direction):
 
 def parse_dms_coordinates(text):
     """Parse DMS coordinates like 31°44'49.8"N 35°01'46.6"E"""
-    # Pattern for DMS format: degrees°minutes'seconds"direction
-    dms_pattern = r'(\d+)°(\d+)\'([\d.]+)"([NSEW])\s*(\d+)°(\d+)\'([\d.]+)"([NSEW])'
-    match = re.search(dms_pattern, text)
+    # DMS format: degrees°minutes'seconds"direction
+    match = DMS_PAIR_PATTERN.search(text)
     
     if match:
         try:
@@ -79,31 +165,22 @@ def parse_dms_coordinates(text):
     return None, None
 
 def expand_short_url(url):
-    """Expand short Google Maps URL to get the full URL with coordinates"""
+    """Expand short Google Maps URL to get the full URL with coordinates (blocking)"""
     try:
-        # Define headers for HTTP requests
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none'
-        }
-        
         # Check if it's a short Google Maps URL
         if 'maps.app.goo.gl' in url or 'goo.gl' in url:
+            if not outbound_budget.try_acquire('expand'):
+                logger.warning("Outbound budget exhausted, not expanding short URL")
+                return url
+            
             # For maps.app.goo.gl, try to expand first, then fallback
             if 'maps.app.goo.gl' in url:
                 # Try to expand the URL first
                 try:
-                    response = requests.get(url, allow_redirects=True, timeout=1, headers=headers)
-                    if response.url != url:
-                        logger.info(f"Successfully expanded maps.app.goo.gl: {response.url}")
-                        return response.url
+                    expanded_url = short_url_expander.expand_blocking(url, http_session)
+                    if expanded_url != url:
+                        logger.info(f"Successfully expanded maps.app.goo.gl: {expanded_url}")
+                        return expanded_url
                 except Exception as e:
                     logger.warning(f"Failed to expand maps.app.goo.gl: {e}")
                 
@@ -113,10 +190,10 @@ def expand_short_url(url):
             
             # For other short URLs, try GET request with shorter timeout
             try:
-                response = requests.get(url, allow_redirects=True, timeout=1, headers=headers)
-                if response.url != url:
-                    logger.info(f"Successfully expanded URL: {response.url}")
-                    return response.url
+                expanded_url = short_url_expander.expand_blocking(url, http_session)
+                if expanded_url != url:
+                    logger.info(f"Successfully expanded URL: {expanded_url}")
+                    return expanded_url
             except Exception as e:
                 logger.warning(f"GET request failed: {e}")
             
@@ -125,8 +202,72 @@ def expand_short_url(url):
         logger.error(f"Error expanding short URL: {e}")
         return url
 
-def extract_coordinates_from_google_maps_api(url):
-    """Extract coordinates from Google Maps URL using Google Maps API"""
+def api_location_by_place_id(url, context=None):
+    """Place details API for the place ID in the URL (blocking; the place ID is found once per context)"""
+    if context is None:
+        place_id = extract_place_id_from_url(url)
+    else:
+        if context.place_id is UNSET:
+            # A Places API id encoded in the URL beats one guessed from it
+            if context.maps_data is not None and context.maps_data.place_id:
+                context.place_id = context.maps_data.place_id
+            else:
+                context.place_id = extract_place_id_from_url(url, expanded_url=context.expanded_url or url)
+        place_id = context.place_id
+    logger.info(f"Extracted place ID: {place_id}")
+    if not place_id:
+        return None, None
+    
+    logger.info(f"Calling Google Maps API with place ID: {place_id}")
+    lat, lng = places_client.place_location(place_id, context)
+    if lat is not None:
+        logger.info(f"Found coordinates via place ID: {lat}, {lng}")
+    else:
+        logger.warning(f"No place details found for place ID: {place_id}")
+    return lat, lng
+
+def api_location_by_text_search(url, context=None):
+    """Text search API for the place name in the URL path (blocking; the name is found once per context)"""
+    if context is not None and context.place_name is not UNSET:
+        location_name = context.place_name
+    elif context is not None and context.maps_data is not None and context.maps_data.name:
+        # Percent-decoded, so non-Latin names are searched as written
+        location_name = context.place_name = context.maps_data.name
+    else:
+        # Extract location name from URL
+        if context is not None and context.expanded_url:
+            expanded_url = context.expanded_url
+        else:
+            expanded_url = expand_short_url(url)
+        
+        # Extract location name from the URL path
+        location_name = None
+        if '/place/' in expanded_url:
+            place_match = re.search(r'/place/([^/]+)', expanded_url)
+            if place_match:
+                location_name = place_match.group(1).replace('+', ' ')
+                logger.info(f"Extracted location name: {location_name}")
+        if context is not None:
+            context.place_name = location_name
+    
+    if not location_name:
+        logger.warning("Could not extract location name from URL")
+        return None, None
+    
+    logger.info(f"Searching for location: {location_name}")
+    lat, lng = places_client.text_search_location(location_name, context)
+    if lat is not None:
+        logger.info(f"Found coordinates via text search: {lat}, {lng}")
+    else:
+        logger.warning(f"No search results found for: {location_name}")
+    return lat, lng
+
+def extract_coordinates_from_google_maps_api(url, context=None):
+    """Extract coordinates from Google Maps URL using Google Maps API
+
+    With a ResolutionContext the already expanded URL and place ID are
+    reused instead of being fetched again, and API calls are traced on it.
+    """
     if not GOOGLE_MAPS_API_AVAILABLE:
         logger.warning("Google Maps API not available")
         return None, None
@@ -134,73 +275,28 @@ def extract_coordinates_from_google_maps_api(url):
     try:
         logger.info(f"Trying to extract coordinates via API for URL: {url}")
         
-        # Get API key from environment
-        api_key = os.getenv('GOOGLE_MAPS_API_KEY')
-        if not api_key:
+        # Shared client (API key is read once)
+        if not places_client.available:
             logger.warning("Google Maps API key not found")
             return None, None
         
-        # Initialize Google Maps client with shorter timeout
-        gmaps = googlemaps.Client(key=api_key, timeout=2)
-        
-        # First try to extract place ID from URL
-        place_id = extract_place_id_from_url(url)
-        logger.info(f"Extracted place ID: {place_id}")
-        
-        if place_id:
-            try:
-                # Get place details by place ID
-                logger.info(f"Calling Google Maps API with place ID: {place_id}")
-                place_details = gmaps.place(place_id)
-                
-                if place_details and 'result' in place_details:
-                    location = place_details['result'].get('geometry', {}).get('location', {})
-                    if location:
-                        lat = location.get('lat')
-                        lng = location.get('lng')
-                        if lat is not None and lng is not None:
-                            logger.info(f"Found coordinates via place ID: {lat}, {lng}")
-                            return lat, lng
-                else:
-                    logger.warning(f"No place details found for place ID: {place_id}")
-            except Exception as e:
-                logger.warning(f"Place ID method failed: {e}")
+        # First try the place ID from the URL
+        try:
+            lat, lng = api_location_by_place_id(url, context)
+            if lat is not None:
+                return lat, lng
+        except OutboundBudgetExhausted:
+            raise
+        except Exception as e:
+            logger.warning(f"Place ID method failed: {e}")
         
         # If place ID method fails, try text search
         try:
-            logger.info("Trying text search method...")
-            # Extract location name from URL
-            expanded_url = expand_short_url(url)
-            
-            # Extract location name from the URL path
-            location_name = None
-            if '/place/' in expanded_url:
-                # Extract the place name from the URL
-                place_match = re.search(r'/place/([^/]+)', expanded_url)
-                if place_match:
-                    location_name = place_match.group(1).replace('+', ' ')
-                    logger.info(f"Extracted location name: {location_name}")
-            
-            if location_name:
-                # Search for the location
-                logger.info(f"Searching for location: {location_name}")
-                search_result = gmaps.places(location_name)
-                
-                if search_result and 'results' in search_result and search_result['results']:
-                    # Get the first result
-                    first_result = search_result['results'][0]
-                    location = first_result.get('geometry', {}).get('location', {})
-                    if location:
-                        lat = location.get('lat')
-                        lng = location.get('lng')
-                        if lat is not None and lng is not None:
-                            logger.info(f"Found coordinates via text search: {lat}, {lng}")
-                            return lat, lng
-                else:
-                    logger.warning(f"No search results found for: {location_name}")
-            else:
-                logger.warning("Could not extract location name from URL")
-        
+            lat, lng = api_location_by_text_search(url, context)
+            if lat is not None:
+                return lat, lng
+        except OutboundBudgetExhausted:
+            raise
         except Exception as e:
             logger.warning(f"Text search method failed: {e}")
         
@@ -232,16 +328,19 @@ def extract_coordinates_from_google_maps_api(url):
         
         return None, None
         
+    except OutboundBudgetExhausted:
+        raise
     except Exception as e:
         logger.error(f"Error extracting coordinates via Google Maps API: {e}")
         return None, None
 
-def extract_place_id_from_url(url):
-    """Extract place ID from Google Maps URL"""
+def extract_place_id_from_url(url, expanded_url=None):
+    """Extract place ID from Google Maps URL (pass expanded_url to skip expansion)"""
     try:
         # Expand short URL first
-        expanded_url = expand_short_url(url)
-        logger.info(f"Expanded URL: {expanded_url}")
+        if expanded_url is None:
+            expanded_url = expand_short_url(url)
+            logger.info(f"Expanded URL: {expanded_url}")
         
         # Pattern for place ID in URL - updated for modern Google Maps URLs
         place_patterns = [
@@ -291,364 +390,235 @@ def extract_place_id_from_url(url):
         logger.error(f"Error extracting place ID: {e}")
         return None
 
-def extract_coordinates_from_input(text):
-    """Extract coordinates from text (Google Maps URL or coordinates)"""
-    # logger.info(f"Extracting coordinates from input: {text}")  # Removed for speed
+async def resolve_short_url(url):
+    """Resolve short Google Maps URL to (lat, lng, expanded_url), trying fast methods first, then API"""
+    context = ResolutionContext(url)
+    lat = lng = None
+    try:
+        lat, lng = await resolve_with_context(context)
+    finally:
+        context.finish(lat is not None)
+    return lat, lng, context.expanded_url
+
+async def expand_for_race(context):
+    """One expansion request for the short URL in context (one outbound fetch)"""
+    outbound_budget.acquire('expand')
+    started = time.monotonic()
+    try:
+        return await short_url_expander.expand(context.url)
+    finally:
+        context.add_round_trip('expand', time.monotonic() - started)
+
+def decode_context_maps_data(context):
+    """Decode what the expanded URL encodes into context; returns its pin location"""
+    context.maps_data = decode_maps_data(context.expanded_url)
+    return context.maps_data.lat, context.maps_data.lng
+
+def local_strategy(name, func, *args):
+    """Run an in-process step and count it with the raced strategies"""
+    started = time.monotonic()
+    coords = func(*args)
+    strategy_stats.record(name, 'wins' if valid_location(coords) else 'misses', time.monotonic() - started)
+    return coords
+
+async def resolve_with_context(context):
+    """
+    Run the short URL pipeline; network steps are raced with hedged starts.
+    
+    Expansion gets a second request after EXPAND_HEDGE_DELAY if the first
+    has not answered. Then the expanded URL is parsed locally, and only if
+    that fails do the place ID and text search API calls race, the text
+    search starting after the place API's p95 latency (at least
+    TEXT_SEARCH_HEDGE_DELAY) or as soon as the place ID call misses.
+    Cancelling the losing API strategy does not stop its worker thread:
+    the request still completes, is billed and spends the outbound budget,
+    so the hedge only fires for calls slower than usual.
+    
+    While the short link host's circuit is open the cheaper paths still
+    run without expansion, but a miss raises CircuitOpenError so it is
+    not cached.
+    """
+    url = context.url
+    
+    circuit_open = None
+    try:
+        winner, expanded_url = await race([
+            Strategy('expand', lambda: expand_for_race(context), 0),
+            Strategy('expand_hedge', lambda: expand_for_race(context), EXPAND_HEDGE_DELAY)
+        ], validate=lambda expanded: expanded is not None)
+    except CircuitOpenError as e:
+        circuit_open = e
+        winner = expanded_url = None
+    if expanded_url is None or expanded_url == url:
+        # Fallback to place ID method
+        place_id = url.split('/')[-1].split('?')[0]
+        expanded_url = f"https://www.google.com/maps/place/{place_id}" if 'maps.app.goo.gl' in url else url
+    else:
+        logger.info(f"Successfully expanded URL via {winner}: {expanded_url}")
+    context.expanded_url = expanded_url
+    
+    # Try to extract coordinates from expanded URL
+    with stage_latency.time('url_regex'):
+        coords = local_strategy('expanded_url', extract_coordinates_from_google_maps, expanded_url)
+    if coords[0] is not None:
+        logger.info(f"Found coordinates from expanded URL: {coords}")
+        return coords
+    
+    # Pin location from the data= chain (also used below for place id and name)
+    coords = local_strategy('data_chain', decode_context_maps_data, context)
+    if coords[0] is not None:
+        logger.info(f"Found coordinates in data chain: {coords}")
+        return coords
     
-    # First try direct coordinate parsing (fastest)
-    coord_pattern = r'(-?\d+\.?\d*),\s*(-?\d+\.?\d*)'
-    match = re.search(coord_pattern, text)
+    # Try to extract coordinates from the place URL built from the short link
+    place_id = url.split('/')[-1].split('?')[0]
+    fallback_url = f"https://www.google.com/maps/place/{place_id}"
+    coords = local_strategy('fallback_url', extract_coordinates_from_google_maps, fallback_url)
+    if coords[0] is not None:
+        logger.info(f"Found coordinates from fallback URL: {coords}")
+        return coords
+    
+    # Google Maps API (slower but more reliable); the context carries the
+    # expanded URL, so neither strategy expands again
+    if GOOGLE_MAPS_API_AVAILABLE and places_client.available:
+        place_api_p95 = places_client.health.endpoint('place_api', places_client.timeout).p95
+        text_search_delay = max(TEXT_SEARCH_HEDGE_DELAY, place_api_p95 or 0.0)
+        winner, coords = await race([
+            Strategy('place_api', lambda: worker_pool.run(api_location_by_place_id, url, context), 0),
+            Strategy('text_search', lambda: worker_pool.run(api_location_by_text_search, url, context),
+                     text_search_delay)
+        ])
+        if winner is not None:
+            logger.info(f"Found coordinates via {winner}: {coords}")
+            return coords
+    
+    # Final fallback: try to extract coordinates from the short URL itself
+    # Some short URLs contain coordinates in the path
+    coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', url)
+    if coords_match:
+        lat, lng = coords_match.groups()
+        # Validate coordinate ranges
+        lat, lng = float(lat), float(lng)
+        if -90 <= lat <= 90 and -180 <= lng <= 180:
+            logger.info(f"Found coordinates in short URL: {lat}, {lng}")
+            return lat, lng
+    
+    if circuit_open is not None:
+        raise circuit_open
+    return None, None
+
+async def resolve_short_url_cached(short_url):
+    """Resolve a short Google Maps URL through the resolution cache"""
+    cache_key = normalize_short_url(short_url)
+    cached = resolution_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Resolution cache hit for {cache_key}: {cached.lat}, {cached.lng}")
+        return cached.lat, cached.lng
+    try:
+        lat, lng, expanded_url = await resolve_short_url(short_url)
+        resolution_cache.set(cache_key, CachedResolution(lat, lng, expanded_url), negative=lat is None)
+        if lat is None:
+            logger.warning("Could not extract coordinates from short URL")
+        return lat, lng
+    except PoolBusyError:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing short URL: {e}")
+        return None, None
+
+async def extract_coordinates_from_input(text):
+    """Extract the first resolvable location from text (Google Maps URL or coordinates)"""
+    for kind, source in classify_message(text).candidates:
+        coords = await resolve_candidate(kind, source)
+        if coords[0] is not None:
+            logger.info(f"Found coordinates via {kind}: {coords}")
+            return coords
+    
+    logger.warning("No coordinates found in input")
+    return None, None
+
+def find_location_candidates(text):
+    """Find every location in a message as (kind, source) in order of appearance"""
+    return classify_message(text, MAX_LOCATIONS_PER_MESSAGE).candidates
+
+def parse_decimal_pair(text):
+    """Parse a 'lat, lng' pair, validating coordinate ranges"""
+    match = DECIMAL_PAIR_PATTERN.search(text)
     if match:
         try:
             lat, lng = float(match.group(1)), float(match.group(2))
-            # Validate coordinate ranges
             if -90 <= lat <= 90 and -180 <= lng <= 180:
-                logger.info(f"Found coordinates via direct pattern: {lat}, {lng}")
                 return lat, lng
         except ValueError:
             pass
-    
-    # For Google Maps short URLs, try fast methods first, then API
-    if 'maps.app.goo.gl' in text:
-        logger.info("Processing short Google Maps URL")
-        try:
-            # First try to expand the URL to get the full URL
-            expanded_url = expand_short_url(text)
-            logger.info(f"Expanded URL: {expanded_url}")
-            
-            # Try to extract coordinates from expanded URL
-            coords = extract_coordinates_from_google_maps(expanded_url)
-            if coords[0] is not None:
-                logger.info(f"Found coordinates from expanded URL: {coords}")
-                return coords
-            
-            # If no coordinates found in expanded URL, try place ID method
-            place_id = text.split('/')[-1].split('?')[0]
-            fallback_url = f"https://www.google.com/maps/place/{place_id}"
-            
-            # Try to extract coordinates from fallback URL
-            coords = extract_coordinates_from_google_maps(fallback_url)
-            if coords[0] is not None:
-                logger.info(f"Found coordinates from fallback URL: {coords}")
-                return coords
-            
-            # If no coordinates found, try Google Maps API (slower but more reliable)
-            if GOOGLE_MAPS_API_AVAILABLE:
-                coords = extract_coordinates_from_google_maps_api(text)
-                if coords[0] is not None:
-                    logger.info(f"Found coordinates via API: {coords}")
-                    return coords
-                
-                # Try API with expanded URL
-                coords = extract_coordinates_from_google_maps_api(expanded_url)
-                if coords[0] is not None:
-                    logger.info(f"Found coordinates via API with expanded URL: {coords}")
-                    return coords
-            
-            # Final fallback: try to extract coordinates from the short URL itself
-            # Some short URLs contain coordinates in the path
-            coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', text)
-            if coords_match:
-                lat, lng = coords_match.groups()
-                # Validate coordinate ranges
-                lat, lng = float(lat), float(lng)
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    logger.info(f"Found coordinates in short URL: {lat}, {lng}")
-                    return lat, lng
-            
-            logger.warning("Could not extract coordinates from short URL")
-        except Exception as e:
-            logger.error(f"Error processing short URL: {e}")
-    
-    # Then try to extract from URL using standard methods (fast and reliable)
-    if any(keyword in text.lower() for keyword in ['maps.google.com', 'google.com/maps']):
-        coords = extract_coordinates_from_google_maps(text)
-        if coords[0] is not None:
-            logger.info(f"Found coordinates via standard method: {coords}")
-            return coords
-        
-        # If no coordinates found in URL, don't try API (too slow)
-        logger.warning("No coordinates found in Google Maps URL")
-    
-    # Try to extract DMS coordinates
-    coords = parse_dms_coordinates(text)
-    if coords[0] is not None:
-        logger.info(f"Found coordinates via DMS method: {coords}")
-        return coords
-    
-    logger.warning("No coordinates found in input")
     return None, None
 
+async def resolve_location(kind, source):
+    """Resolve one location candidate; network-bound kinds get their own deadline"""
+    if kind in NETWORK_KINDS:
+        try:
+            return await asyncio.wait_for(resolve_candidate(kind, source), RESOLUTION_DEADLINE)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Resolution deadline exceeded for {source}")
+            metrics.errors.inc('resolution_timeout')
+            return None, None
+    return await resolve_candidate(kind, source)
+
+async def resolve_candidate(kind, source):
+    """Send one classified location straight to its resolver"""
+    if kind == SHORT_URL:
+        # Short links are also recognised without a scheme; the expander needs one
+        return await resolve_short_url_cached(source if '://' in source else 'https://' + source)
+    if kind == MAPS_URL:
+        with stage_latency.time('url_regex'):
+            return extract_coordinates_from_google_maps(source)
+    if kind == OTHER_MAP_URL:
+        with stage_latency.time('url_regex'):
+            return parse_other_map_url(source)
+    with stage_latency.time('direct_parse'):
+        if kind == DMS:
+            return parse_dms_coordinates(source)
+        return parse_decimal_pair(source)
+
+async def extract_all_coordinates_from_input(text, candidates=None):
+    """
+    Extract every location in a message as a list of (source, lat, lng).
+    
+    Candidates (from classify_message, found here if not given) resolve
+    concurrently, so a message with several short links takes about as
+    long as the slowest one. Raises PoolBusyError only when nothing was
+    found and at least one resolution was rejected as busy; a plain busy
+    pool is reported before an open circuit or exhausted budget.
+    """
+    if candidates is None:
+        candidates = find_location_candidates(text)
+    results = await asyncio.gather(*(resolve_location(kind, source) for kind, source in candidates),
+                                   return_exceptions=True)
+    
+    locations = []
+    busy = None
+    for (kind, source), result in zip(candidates, results):
+        if isinstance(result, PoolBusyError):
+            if busy is None or type(result) is PoolBusyError:
+                busy = result
+            result = (None, None)
+        elif isinstance(result, Exception):
+            logger.error(f"Error resolving {kind} {source}: {result}")
+            metrics.errors.inc(type(result).__name__)
+            result = (None, None)
+        locations.append((source, result[0], result[1]))
+    
+    if busy is not None and all(lat is None for _, lat, _ in locations):
+        raise busy
+    return locations
+
 def extract_coordinates_from_google_maps(url):
     """Extract latitude and longitude from Google Maps URL"""
-    import urllib.parse
     try:
-        expanded_url = url
-        # Если это consent.google.com, ищем только в параметре continue
-        if 'consent.google.com' in expanded_url:
-            continue_match = re.search(r'continue=([^&]+)', expanded_url)
-            if continue_match:
-                continue_data = urllib.parse.unquote(continue_match.group(1))
-                # Сначала ищем паттерн с плюсом
-                match = re.search(r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)', continue_data)
-                if match:
-                    lat, lng = match.groups()
-                    logger.info(f"Found coordinates via consent continue +: {lat}, {lng}")
-                    return float(lat), float(lng)
-                # Потом обычный паттерн
-                match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', continue_data)
-                if match:
-                    lat, lng = match.groups()
-                    logger.info(f"Found coordinates via consent continue: {lat}, {lng}")
-                    return float(lat), float(lng)
-                # Ищем паттерн !3d и !4d (для place ссылок)
-                match = re.search(r'!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)', continue_data)
-                if match:
-                    lat, lng = match.groups()
-                    logger.info(f"Found coordinates via consent continue !3d!4d: {lat}, {lng}")
-                    return float(lat), float(lng)
-            return None, None
-        # Pattern for @lat,lng format
-        coords_pattern = r'@(-?\d+\.?\d*),(-?\d+\.?\d*)'
-        match = re.search(coords_pattern, expanded_url)
-        
-        if match:
-            lat, lng = match.groups()
-            logger.info(f"Found coordinates via @ pattern: {lat}, {lng}")
-            return float(lat), float(lng)
-        
-        # Pattern for @lat,lng,zoom format (with zoom level)
-        coords_zoom_pattern = r'@(-?\d+\.?\d*),(-?\d+\.?\d*),(\d+z)'
-        match = re.search(coords_zoom_pattern, expanded_url)
-        
-        if match:
-            lat, lng, zoom = match.groups()
-            logger.info(f"Found coordinates via @zoom pattern: {lat}, {lng}")
-            return float(lat), float(lng)
-        
-        # Pattern for !3d and !4d format (newer Google Maps)
-        coords_3d4d_pattern = r'!3d(-?\d+\.?\d*)!4d(-?\d+\.?\d*)'
-        match = re.search(coords_3d4d_pattern, expanded_url)
-        
-        if match:
-            lat, lng = match.groups()
-            logger.info(f"Found coordinates via !3d!4d pattern: {lat}, {lng}")
-            return float(lat), float(lng)
-        
-        # Pattern for !1d and !2d format (alternative)
-        coords_1d2d_pattern = r'!1d(-?\d+\.?\d*)!2d(-?\d+\.?\d*)'
-        match = re.search(coords_1d2d_pattern, expanded_url)
-        
-        if match:
-            lat, lng = match.groups()
-            logger.info(f"Found coordinates via !1d!2d pattern: {lat}, {lng}")
-            return float(lat), float(lng)
-        
-        # Pattern for ll parameter
-        parsed_url = urlparse(expanded_url)
-        if 'll' in parsed_url.query:
-            params = parse_qs(parsed_url.query)
-            if 'll' in params:
-                coords = params['ll'][0].split(',')
-                if len(coords) == 2:
-                    logger.info(f"Found coordinates via ll parameter: {coords[0]}, {coords[1]}")
-                    return float(coords[0]), float(coords[1])
-        
-        # Pattern for q parameter with coordinates
-        if 'q' in parsed_url.query:
-            params = parse_qs(parsed_url.query)
-            if 'q' in params:
-                q_value = params['q'][0]
-                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', q_value)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    logger.info(f"Found coordinates via q parameter: {lat}, {lng}")
-                    return float(lat), float(lng)
-        
-        # Pattern for place parameter (newer Google Maps format)
-        if 'place' in parsed_url.path:
-            # Try to extract coordinates from place path
-            place_pattern = r'place/([^/]+)'
-            place_match = re.search(place_pattern, expanded_url)
-            if place_match:
-                place_data = place_match.group(1)
-                # Look for coordinates in the place data
-                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', place_data)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    logger.info(f"Found coordinates via place path: {lat}, {lng}")
-                    return float(lat), float(lng)
-        
-        # Pattern for search parameter with coordinates
-        if 'search' in parsed_url.path:
-            search_pattern = r'search/([^/]+)'
-            search_match = re.search(search_pattern, expanded_url)
-            if search_match:
-                search_data = search_match.group(1)
-                # Look for coordinates in the search data
-                coords_match = re.search(r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)', search_data)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    logger.info(f"Found coordinates via search path with +: {lat}, {lng}")
-                    return float(lat), float(lng)
-                # Also try without +
-                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', search_data)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    logger.info(f"Found coordinates via search path: {lat}, {lng}")
-                    return float(lat), float(lng)
-                coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', search_data)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    logger.info(f"Found coordinates via search path: {lat}, {lng}")
-                    return float(lat), float(lng)
-        
-        # Try to extract coordinates from the entire expanded URL
-        # This is a fallback for complex URLs
-        # URL decode first to handle encoded coordinates
-        import urllib.parse
-        decoded_url = urllib.parse.unquote(expanded_url)
-        coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', decoded_url)
-        if coords_match:
-            lat, lng = coords_match.groups()
-            # Validate coordinate ranges
-            lat, lng = float(lat), float(lng)
-            if -90 <= lat <= 90 and -180 <= lng <= 180:
-                logger.info(f"Found coordinates via fallback pattern: {lat}, {lng}")
-                return lat, lng
-        
-        # Try to extract coordinates from /search/ path in Google Maps URL
-        search_pattern = r'/search/(-?\d+\.?\d*),?\s*(-?\d+\.?\d*)'
-        search_match = re.search(search_pattern, expanded_url)
-        if search_match:
-            lat, lng = search_match.groups()
-            # Validate coordinate ranges
-            lat, lng = float(lat), float(lng)
-            if -90 <= lat <= 90 and -180 <= lng <= 180:
-                logger.info(f"Found coordinates via search path pattern: {lat}, {lng}")
-                return lat, lng
-        
-        # Try to extract from the continue parameter in consent URLs (check this first)
-        continue_match = re.search(r'continue=([^&]+)', expanded_url)
-        if continue_match:
-            continue_data = urllib.parse.unquote(continue_match.group(1))
-            logger.info(f"Continue data: {continue_data}")
-            
-            # Look for coordinates in continue data
-            # Try different patterns for coordinates
-            coord_patterns = [
-                r'(-?\d+\.?\d*),(-?\d+\.?\d*)',  # Standard format
-                r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)',  # With plus sign
-                r'(-?\d+\.?\d*),%2B(-?\d+\.?\d*)',  # URL encoded plus
-            ]
-            
-            for pattern in coord_patterns:
-                coords_match = re.search(pattern, continue_data)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    # Validate coordinate ranges
-                    lat, lng = float(lat), float(lng)
-                    if -90 <= lat <= 90 and -180 <= lng <= 180:
-                        logger.info(f"Found coordinates via continue parameter: {lat}, {lng}")
-                        return lat, lng
-            
-            # Also try the original encoded continue data
-            original_continue = continue_match.group(1)
-            for pattern in coord_patterns:
-                coords_match = re.search(pattern, original_continue)
-                if coords_match:
-                    lat, lng = coords_match.groups()
-                    # Validate coordinate ranges
-                    lat, lng = float(lat), float(lng)
-                    if -90 <= lat <= 90 and -180 <= lng <= 180:
-                        logger.info(f"Found coordinates via original continue parameter: {lat}, {lng}")
-                        return lat, lng
-        
-        # Try to extract coordinates from search path (new pattern) - but only if it's not a consent URL
-        if 'consent.google.com' not in expanded_url:
-            search_coords_pattern = r'search/([^?]+)'
-            search_match = re.search(search_coords_pattern, expanded_url)
-            if search_match:
-                search_data = search_match.group(1)
-                # URL decode the search data first
-                import urllib.parse
-                decoded_data = urllib.parse.unquote(search_data)
-                logger.info(f"Decoded search data: {decoded_data}")
-                
-                # Try to find coordinates in decoded data with different patterns
-                coord_patterns = [
-                    r'(-?\d+\.?\d*),\+(-?\d+\.?\d*)',  # With plus sign
-                    r'(-?\d+\.?\d*),(-?\d+\.?\d*)',   # Standard format
-                    r'(-?\d+\.?\d*),%2B(-?\d+\.?\d*)', # URL encoded plus
-                ]
-                
-                for pattern in coord_patterns:
-                    coords_match = re.search(pattern, decoded_data)
-                    if coords_match:
-                        lat, lng = coords_match.groups()
-                        # Validate coordinate ranges
-                        lat, lng = float(lat), float(lng)
-                        if -90 <= lat <= 90 and -180 <= lng <= 180:
-                            logger.info(f"Found coordinates via search path pattern: {lat}, {lng}")
-                            return lat, lng
-                
-                # Also try in the original search_data (before decoding)
-                for pattern in coord_patterns:
-                    coords_match = re.search(pattern, search_data)
-                    if coords_match:
-                        lat, lng = coords_match.groups()
-                        # Validate coordinate ranges
-                        lat, lng = float(lat), float(lng)
-                        if -90 <= lat <= 90 and -180 <= lng <= 180:
-                            logger.info(f"Found coordinates via original search data: {lat}, {lng}")
-                            return lat, lng
-        else:
-            # For consent URLs, skip search path extraction and go directly to continue parameter
-            logger.info("Skipping search path extraction for consent URL")
-            # Don't return here, continue to the next checks
-            pass
-        
-        # Try to extract coordinates from place path (modern Google Maps format)
-        place_coords_pattern = r'place/([^/]+)'
-        place_match = re.search(place_coords_pattern, expanded_url)
-        if place_match:
-            place_data = place_match.group(1)
-            # Look for coordinates in the place data
-            coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', place_data)
-            if coords_match:
-                lat, lng = coords_match.groups()
-                # Validate coordinate ranges
-                lat, lng = float(lat), float(lng)
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    logger.info(f"Found coordinates via place path: {lat}, {lng}")
-                    return lat, lng
-        
-        # Try to extract from complex query parameters
-        # Look for coordinates in various parameter formats
-        for param_name in ['q', 'll', 'sll', 'daddr']:
-            if param_name in parsed_url.query:
-                params = parse_qs(parsed_url.query)
-                if param_name in params:
-                    param_value = params[param_name][0]
-                    # Try to find coordinates in parameter value
-                    coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', param_value)
-                    if coords_match:
-                        lat, lng = coords_match.groups()
-                        lat, lng = float(lat), float(lng)
-                        if -90 <= lat <= 90 and -180 <= lng <= 180:
-                            return lat, lng
-        
-        # Try to extract from path segments
-        path_segments = parsed_url.path.split('/')
-        for segment in path_segments:
-            coords_match = re.search(r'(-?\d+\.?\d*),(-?\d+\.?\d*)', segment)
-            if coords_match:
-                lat, lng = coords_match.groups()
-                lat, lng = float(lat), float(lng)
-                if -90 <= lat <= 90 and -180 <= lng <= 180:
-                    return lat, lng
-        
-        return None, None
+        lat, lng, shape = extract_coordinates_with_shape(url)
+        if lat is not None:
+            logger.info(f"Found coordinates via {shape}: {lat}, {lng}")
+        return lat, lng
     except Exception as e:
         logger.error(f"Error extracting coordinates: {e}")
         return None, None
@@ -663,35 +633,17 @@ def is_admin_user(user_id: int) -> bool:
 
 def get_user_language(user_id: int) -> str:
     """Get user's preferred language"""
-    try:
-        # Try to load user preferences from file
-        with open('user_preferences.json', 'r', encoding='utf-8') as f:
-            preferences = json.load(f)
-            return preferences.get(str(user_id), 'en')
-    except (FileNotFoundError, json.JSONDecodeError):
-        return 'en'
+    return preferences_store.get_language(user_id, 'en')
 
 def save_user_language(user_id: int, language: str):
     """Save user's language preference"""
     try:
-        # Load existing preferences
-        try:
-            with open('user_preferences.json', 'r', encoding='utf-8') as f:
-                preferences = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            preferences = {}
-        
-        # Update user preference
-        preferences[str(user_id)] = language
-        
-        # Save preferences
-        with open('user_preferences.json', 'w', encoding='utf-8') as f:
-            json.dump(preferences, f, ensure_ascii=False, indent=2)
+        preferences_store.set_language(user_id, language)
     except Exception as e:
         logging.error(f"Error saving user language: {e}")
 
-def create_menu_keyboard(lang: str = 'en') -> InlineKeyboardMarkup:
-    """Create main menu keyboard"""
+def build_menu_keyboard(lang: str) -> InlineKeyboardMarkup:
+    """Build main menu keyboard"""
     keyboard = [
         [
             InlineKeyboardButton(
@@ -708,8 +660,8 @@ def create_menu_keyboard(lang: str = 'en') -> InlineKeyboardMarkup:
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def create_language_keyboard() -> InlineKeyboardMarkup:
-    """Create language selection keyboard"""
+def build_language_keyboard() -> InlineKeyboardMarkup:
+    """Build language selection keyboard"""
     keyboard = []
     row = []
     for lang_code, lang_name in LANGUAGES.items():
@@ -734,6 +686,18 @@ def create_language_keyboard() -> InlineKeyboardMarkup:
     
     return InlineKeyboardMarkup(keyboard)
 
+# Keyboards are immutable, so each is built once and reused for every reply
+MENU_KEYBOARDS = {lang: build_menu_keyboard(lang) for lang in LANGUAGES}
+LANGUAGE_KEYBOARD = build_language_keyboard()
+
+def create_menu_keyboard(lang: str = 'en') -> InlineKeyboardMarkup:
+    """Main menu keyboard for a language"""
+    return MENU_KEYBOARDS.get(lang, MENU_KEYBOARDS['en'])
+
+def create_language_keyboard() -> InlineKeyboardMarkup:
+    """Language selection keyboard"""
+    return LANGUAGE_KEYBOARD
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Send a message when the command /start is issued."""
     user_id = update.effective_user.id
@@ -741,22 +705,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_id = update.message.message_id
     chat_id = update.effective_chat.id
     
-    # Create unique message identifier
-    message_key = f"{chat_id}_{message_id}_start"
-    
-    # Check if message was already processed
-    if message_key in processed_messages:
+    # Check if message was already processed (and remember it otherwise)
+    message_key = ('start', chat_id, message_id)
+    if update_deduplicator.seen(message_key):
         print(f"⚠️ DUPLICATE START command detected: {message_key}")
         return
     
-    # Add to processed messages
-    processed_messages.add(message_key)
-    
     print(f"🔍 START command received from user {user_id}")
     
     # Track analytics
-    if ANALYTICS_AVAILABLE and analytics:
-        analytics.track_user_interaction(user_id, "start_command", True)
+    analytics_sink.track_user_interaction(user_id, "start_command", True)
     
     api_status = get_text('api_available', lang) if GOOGLE_MAPS_API_AVAILABLE else get_text('api_unavailable', lang)
     welcome_message = get_text('welcome', lang, api_status=api_status)
@@ -845,8 +803,6 @@ async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming messages and convert Google Maps links or coordinates to Waze"""
-    global processed_messages
-    
     user_id = update.effective_user.id
     lang = get_user_language(user_id)
     message_text = update.message.text
@@ -855,31 +811,35 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_id = update.message.message_id
     chat_id = update.effective_chat.id
     
-    # Create unique message identifier with timestamp
-    import time
-    current_time = int(time.time())
-    message_key = f"{chat_id}_{message_id}_{current_time}"
-    
-    # Check if message was already processed (within last 60 seconds)
-    for old_key in list(processed_messages):
-        if old_key.startswith(f"{chat_id}_{message_id}_"):
-            old_time = int(old_key.split('_')[-1])
-            if current_time - old_time < 60:  # Within 60 seconds
-                print(f"⚠️ DUPLICATE message detected: {message_key}")
-                return
-    
-    # Add to processed messages
-    processed_messages.add(message_key)
-    
-    # Clean up old messages (keep only last 500 and remove old ones)
-    if len(processed_messages) > 500:
-        # Remove messages older than 5 minutes
-        current_time = int(time.time())
-        processed_messages = {key for key in processed_messages 
-                           if current_time - int(key.split('_')[-1]) < 300}
+    # Check if message was already processed (within the dedup window)
+    message_key = ('message', chat_id, message_id)
+    if update_deduplicator.seen(message_key):
+        print(f"⚠️ DUPLICATE message detected: {message_key}")
+        return
+    
+    # One scan decides what the message holds; group chatter is dropped right here
+    classification = classify_message(message_text, MAX_LOCATIONS_PER_MESSAGE)
+    if classification.label == NOT_LOCATION and update.effective_chat.type != 'private':
+        return
     
     print(f"🔍 MESSAGE received from user {user_id} (msg_id: {message_id}): {message_text[:50]}...")
     
+    # Rate limits (admins exempt); one throttle reply per streak, not per message
+    if not is_admin_user(user_id):
+        decision = user_limiter.check(user_id)
+        if decision.allowed:
+            decision = chat_limiter.check(chat_id)
+            if not decision.allowed:
+                # The message is dropped, so it must not cost the user a token either
+                user_limiter.refund(user_id)
+        if not decision.allowed:
+            print(f"⏱️ Rate limited user {user_id} in chat {chat_id} (retry in {decision.retry_after:.0f}s)")
+            metrics.errors.inc('rate_limited')
+            if decision.notify:
+                seconds = max(1, int(decision.retry_after + 0.999))
+                await update.message.reply_text(get_text('error_rate_limited', lang, seconds=seconds))
+            return
+    
     # Get user info for analytics
     user_info = {
         "username": update.effective_user.username,
@@ -892,36 +852,46 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     start_time = time.time()
     
     # Track analytics
-    if ANALYTICS_AVAILABLE and analytics:
-        analytics.track_user_interaction(user_id, "message_received", True, {"message_length": len(message_text)}, user_info)
-    
-    # Send initial "typing" indicator
-    await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
+    analytics_sink.track_user_interaction(user_id, "message_received", True, {"message_length": len(message_text)}, user_info)
     
     # Initialize processing message variable
     processing_msg = None
     
-    # Send processing message for longer operations
-    if any(keyword in message_text.lower() for keyword in ['maps.google.com', 'goo.gl', 'maps.app.goo.gl']):
+    # Typing indicator and processing message only when resolution goes over the network;
+    # everything else is answered right away
+    if classification.needs_network:
+        await context.bot.send_chat_action(chat_id=update.effective_chat.id, action="typing")
         processing_msg = await update.message.reply_text(get_text('processing', lang))
     
-    # Extract coordinates from input (URL or direct coordinates)
-    lat, lng = extract_coordinates_from_input(message_text)
+    # Resolve every location in the message; short links resolve concurrently
+    try:
+        locations = await extract_all_coordinates_from_input(message_text, classification.candidates)
+    except PoolBusyError as e:
+        print(f"⚠️ Worker pool busy, rejecting message from user {user_id}")
+        metrics.errors.inc('outbound_budget' if isinstance(e, OutboundBudgetExhausted) else 'pool_busy')
+        busy_message = get_text('error_busy', lang)
+        if processing_msg is not None:
+            try:
+                await processing_msg.edit_text(busy_message)
+            except:
+                await update.message.reply_text(busy_message)
+        else:
+            await update.message.reply_text(busy_message)
+        return
     
-    print(f"🔍 EXTRACTED coordinates: lat={lat}, lng={lng}")
+    found = [(source, lat, lng) for source, lat, lng in locations if lat is not None]
+    print(f"🔍 EXTRACTED {len(found)}/{len(locations)} locations")
     
-    if lat is None or lng is None:
+    if not found:
         # Track failed processing
-        if ANALYTICS_AVAILABLE and analytics:
-            analytics.track_link_processing(user_id, message_text, False, error="No coordinates found")
+        analytics_sink.track_link_processing(user_id, message_text, False, error="No coordinates found")
         
         # Track failed request
-        if ANALYTICS_AVAILABLE and analytics:
-            response_time = time.time() - start_time
-            analytics.track_request(user_id, "coordinate_extraction", message_text, response_time, False, user_info)
+        response_time = time.time() - start_time
+        analytics_sink.track_request(user_id, "coordinate_extraction", message_text, response_time, False, user_info)
         
         # Check if it's a Google Maps URL that couldn't be processed
-        if 'maps.google.com' in message_text or 'goo.gl' in message_text or 'maps.app.goo.gl' in message_text:
+        if any(kind in (MAPS_URL, SHORT_URL) for kind, _ in classification.candidates):
             error_message = get_text('error_google_maps', lang)
         else:
             error_message = get_text('error_general', lang)
@@ -938,13 +908,23 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Track successful processing
-    if ANALYTICS_AVAILABLE and analytics:
-        analytics.track_link_processing(user_id, message_text, True, coordinates=(lat, lng))
-    
-    # Generate Waze link
-    waze_url = generate_waze_link(lat, lng)
+    for source, lat, lng in found:
+        analytics_sink.track_link_processing(user_id, source, True, coordinates=(lat, lng))
     
-    response_message = get_text('coordinates_extracted', lang, lat=lat, lng=lng, waze_url=waze_url)
+    if len(locations) == 1:
+        _, lat, lng = found[0]
+        waze_url = generate_waze_link(lat, lng)
+        response_message = get_text('coordinates_extracted', lang, lat=lat, lng=lng, waze_url=waze_url)
+    else:
+        # One combined reply with a Waze link per location
+        items = []
+        for index, (source, lat, lng) in enumerate(locations, 1):
+            if lat is None:
+                items.append(get_text('location_item_failed', lang, index=index, source=source))
+            else:
+                items.append(get_text('location_item', lang, index=index, lat=lat, lng=lng,
+                                      waze_url=generate_waze_link(lat, lng)))
+        response_message = get_text('multiple_locations', lang, count=len(found), items='\n\n'.join(items))
     
     # Edit processing message if it was sent, otherwise send new message
     if processing_msg is not None:
@@ -957,116 +937,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text(response_message)
     
     # Track request completion
-    if ANALYTICS_AVAILABLE and analytics:
-        response_time = time.time() - start_time
-        analytics.track_request(user_id, "coordinate_extraction", message_text, response_time, True, user_info)
-
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        """Handle health check requests and analytics"""
-        try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-            
-            if path == "/" or path == "/health":
-                # Health check
-                self.send_response(200)
-                self.send_header('Content-type', 'text/plain')
-                self.end_headers()
-                self.wfile.write(b'OK')
-            elif path == "/admin":
-                # Admin panel - check user ID from query parameter
-                self.handle_admin_access(parsed_path.query)
-            elif path == "/admin/api/stats":
-                # Admin API - check user ID from query parameter
-                self.handle_admin_api_access(parsed_path.query, "stats")
-            elif path == "/admin/api/user":
-                # Admin API - check user ID from query parameter
-                self.handle_admin_api_access(parsed_path.query, "user")
-            else:
-                self.send_response(404)
-                self.end_headers()
-                
-        except Exception as e:
-            self.send_error(500, f"Internal Server Error: {str(e)}")
-    
-    def do_POST(self):
-        """Handle webhook POST requests from Telegram"""
-        try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-            
-            if path == "/webhook":
-                # Handle Telegram webhook
-                content_length = int(self.headers.get('Content-Length', 0))
-                post_data = self.rfile.read(content_length)
-                
-                # Process the update
-                import json
-                update_data = json.loads(post_data.decode('utf-8'))
-                
-                # Create Update object and process it
-                from telegram import Update
-                update = Update.de_json(update_data, application.bot)
-                
-                # Process the update asynchronously
-                import asyncio
-                asyncio.run(application.process_update(update))
-                
-                self.send_response(200)
-                self.send_header('Content-type', 'application/json')
-                self.end_headers()
-                self.wfile.write(json.dumps({"ok": True}).encode())
-            else:
-                self.send_response(404)
-                self.end_headers()
-                
-        except Exception as e:
-            print(f"❌ Webhook error: {e}")
-            self.send_error(500, f"Webhook Error: {str(e)}")
-    
+    response_time = time.time() - start_time
+    analytics_sink.track_request(user_id, "coordinate_extraction", message_text, response_time, True, user_info)
 
-    
-    def handle_admin_access(self, query):
-        """Handle admin panel access with user ID verification"""
-        try:
-            params = urllib.parse.parse_qs(query)
-            user_id = params.get('user_id', [None])[0]
-            
-            if not user_id or not is_admin_user(int(user_id)):
-                self.send_error(403, "Access denied. Admin privileges required.")
-                return
-            
-            self.send_analytics_page()
-            
-        except Exception as e:
-            self.send_error(500, f"Error accessing admin panel: {str(e)}")
-    
-    def handle_admin_api_access(self, query, api_type):
-        """Handle admin API access with user ID verification"""
-        try:
-            params = urllib.parse.parse_qs(query)
-            user_id = params.get('user_id', [None])[0]
-            
-            if not user_id or not is_admin_user(int(user_id)):
-                self.send_error(403, "Access denied. Admin privileges required.")
-                return
-            
-            if api_type == "stats":
-                self.send_json_stats()
-            elif api_type == "user":
-                self.send_user_stats(query)
-            else:
-                self.send_error(404, "API endpoint not found")
-                
-        except Exception as e:
-            self.send_error(500, f"Error accessing admin API: {str(e)}")
-    
-    def send_analytics_page(self):
-        """Send the analytics HTML page"""
-        try:
-            # Import the HTML content directly
-            html = """
+# Admin analytics dashboard page
+ADMIN_PAGE_HTML = """
 <!DOCTYPE html>
 <html lang="en">
 <head>
@@ -1353,7 +1228,7 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
                 for (const day of data.recent_activity) {
                     html += `
                         <p><strong>${day.date}:</strong> ${day.stats.total_interactions} interactions, 
-                        ${day.stats.unique_users.length} unique users</p>
+                        ${day.stats.unique_users} unique users</p>
                     `;
                 }
             }
@@ -1398,54 +1273,257 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
     </script>
 </body>
 </html>
-            """
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'text/html')
-            self.end_headers()
-            self.wfile.write(html.encode('utf-8'))
-            
-        except Exception as e:
-            self.send_error(500, f"Error loading analytics: {str(e)}")
-    
-    def send_json_stats(self):
-        """Send JSON statistics"""
-        try:
-            from analytics import BotAnalytics
-            analytics = BotAnalytics()
-            stats = analytics.get_global_stats()
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(stats, indent=2).encode('utf-8'))
-            
-        except Exception as e:
-            self.send_error(500, f"Error getting stats: {str(e)}")
-    
-    def send_user_stats(self, query):
-        """Send user-specific statistics"""
+"""
+
+def http_text(status, text):
+    """Plain text HTTP response tuple"""
+    return status, 'text/plain; charset=utf-8', text.encode('utf-8')
+
+def http_json(data, status=200):
+    """JSON HTTP response tuple"""
+    return status, 'application/json', json.dumps(data, indent=2).encode('utf-8')
+
+def with_etag(response, if_none_match=None):
+    """Add an ETag to a 200 response; 304 without a body when the client already has it"""
+    status, content_type, body = response[:3]
+    if status != 200:
+        return status, content_type, body, {}
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return 304, content_type, b'', {'ETag': etag}
+    return status, content_type, body, {'ETag': etag}
+
+def handle_http_get(path, query, headers=None):
+    """Route GET requests for health checks and analytics.
+
+    Returns (status, content_type, body, response_headers) so the same
+    routes are served by the threaded HTTP server and by the async webhook
+    server. Admin API responses carry an ETag and honor If-None-Match.
+    """
+    status, content_type, body = route_http_get(path, query)
+    if path.startswith("/admin/api/"):
+        return with_etag((status, content_type, body), (headers or {}).get('If-None-Match'))
+    return status, content_type, body, {}
+
+def route_http_get(path, query):
+    """Response tuple (status, content_type, body) for a GET route"""
+    if path == "/" or path == "/health":
+        # Health check
+        return http_text(200, 'OK')
+    elif path == "/health/live":
+        healthy, report = health_monitor.liveness()
+        return http_json(report, 200 if healthy else 503)
+    elif path == "/health/ready":
+        healthy, report = health_monitor.readiness()
+        return http_json(report, 200 if healthy else 503)
+    elif path == "/metrics":
+        # Prometheus scrape (counts and latencies only, no user data)
+        return 200, metrics.CONTENT_TYPE, metrics.registry.render().encode('utf-8')
+    elif path == "/admin":
+        # Admin panel - check user ID from query parameter
+        return handle_admin_access(query)
+    elif path == "/admin/api/stats":
+        # Admin API - check user ID from query parameter
+        return handle_admin_api_access(query, "stats")
+    elif path == "/admin/api/user":
+        # Admin API - check user ID from query parameter
+        return handle_admin_api_access(query, "user")
+    elif path == "/admin/api/breakers":
+        # Admin API - check user ID from query parameter
+        return handle_admin_api_access(query, "breakers")
+    return http_text(404, 'Not Found')
+
+def collect_component_metrics():
+    """Scrape-time gauges and counters from caches, worker pool, dedup and webhook"""
+    cache_stats = {
+        'resolution': resolution_cache.get_stats(),
+        'place': places_client.place_cache.get_stats(),
+        'text_search': places_client.search_cache.get_stats()
+    }
+    yield ('waze_bot_cache_hit_ratio', 'Cache hit ratio including negative hits', 'gauge',
+           [({'cache': name}, stats['hit_ratio']) for name, stats in cache_stats.items()])
+    yield ('waze_bot_cache_entries', 'Cache entries', 'gauge',
+           [({'cache': name}, stats['size']) for name, stats in cache_stats.items()])
+    
+    pool_stats = worker_pool.get_stats()
+    yield ('waze_bot_worker_pool_queue_depth', 'Calls waiting for a worker thread', 'gauge',
+           [({}, pool_stats['queued'])])
+    yield ('waze_bot_worker_pool_active', 'Calls running in worker threads', 'gauge',
+           [({}, pool_stats['active'])])
+    yield ('waze_bot_worker_pool_calls_total', 'Worker pool calls by outcome', 'counter',
+           [({'outcome': outcome}, pool_stats[outcome])
+            for outcome in ('completed', 'failed', 'rejected', 'timeouts', 'cancelled')])
+    
+    yield ('waze_bot_dedup_entries', 'Update keys in the dedup window', 'gauge',
+           [({}, len(update_deduplicator))])
+    yield ('waze_bot_dedup_duplicates_total', 'Duplicate updates dropped', 'counter',
+           [({}, update_deduplicator.duplicates)])
+    
+    resolution = resolution_stats.get_stats()
+    yield ('waze_bot_resolutions_total', 'Short URL resolutions by result', 'counter',
+           [({'found': 'true'}, resolution['found']),
+            ({'found': 'false'}, resolution['resolutions'] - resolution['found'])])
+    
+    strategies = strategy_stats.get_stats()
+    yield ('waze_bot_strategy_runs_total', 'Resolution strategy runs by outcome', 'counter',
+           [({'strategy': name, 'outcome': outcome}, counts[outcome])
+            for name, counts in strategies.items() for outcome in ('wins', 'misses', 'errors', 'cancelled')])
+    
+    endpoints = endpoint_health.get_stats()
+    yield ('waze_bot_circuit_open', 'Whether the circuit breaker of an outbound endpoint is not closed', 'gauge',
+           [({'endpoint': name}, int(stats['state'] != 'closed')) for name, stats in endpoints.items()])
+    yield ('waze_bot_endpoint_timeout_seconds', 'Current adaptive timeout per outbound endpoint', 'gauge',
+           [({'endpoint': name}, stats['timeout_ms'] / 1000) for name, stats in endpoints.items()])
+    yield ('waze_bot_endpoint_calls_total', 'Outbound endpoint calls by outcome', 'counter',
+           [({'endpoint': name, 'outcome': outcome}, stats[outcome])
+            for name, stats in endpoints.items() for outcome in ('successes', 'failures', 'refused')])
+    
+    sink_stats = analytics_sink.get_stats()
+    yield ('waze_bot_analytics_buffered', 'Analytics events waiting to be written', 'gauge',
+           [({}, sink_stats['buffered'])])
+    yield ('waze_bot_analytics_events_total', 'Analytics events by outcome', 'counter',
+           [({'outcome': outcome}, sink_stats[outcome]) for outcome in ('enqueued', 'written', 'dropped')])
+    
+    yield ('waze_bot_rate_limited_total', 'Messages rejected by rate limits', 'counter',
+           [({'scope': 'user'}, user_limiter.rejected), ({'scope': 'chat'}, chat_limiter.rejected)])
+    budget_stats = outbound_budget.get_stats()
+    yield ('waze_bot_outbound_calls_total', 'Outbound fetches and API calls by budget outcome', 'counter',
+           [({'kind': kind, 'outcome': outcome}, count)
+            for outcome in ('spent', 'rejected') for kind, count in budget_stats[outcome].items()])
+    
+    processor_stats = update_processor.get_stats()
+    yield ('waze_bot_updates_active', 'Updates being processed', 'gauge',
+           [({}, processor_stats['active'])])
+    yield ('waze_bot_updates_waiting', 'Updates waiting for their chat or a free slot', 'gauge',
+           [({}, processor_stats['waiting'])])
+    yield ('waze_bot_updates_total', 'Updates by outcome', 'counter',
+           [({'outcome': 'processed'}, processor_stats['processed']),
+            ({'outcome': 'dropped'}, processor_stats['dropped'])])
+    
+    if web_server is not None:
+        webhook_stats = web_server.get_stats()
+        yield ('waze_bot_webhook_queue_depth', 'Updates waiting in the webhook queue', 'gauge',
+               [({}, webhook_stats['queued'])])
+        yield ('waze_bot_webhook_updates_total', 'Webhook updates by outcome', 'counter',
+               [({'outcome': 'accepted'}, webhook_stats['accepted']),
+                ({'outcome': 'rejected'}, webhook_stats['rejected'])])
+
+metrics.registry.register_collector(collect_component_metrics)
+
+def register_health_checks(application, get_updates_request=None):
+    """Liveness/readiness checks for the running mode (polling when get_updates_request is given)"""
+    health_monitor.add_readiness_check(
+        'preferences_storage', lambda: (preferences_store.ping(), type(preferences_store).__name__))
+    health_monitor.add_readiness_check(
+        'resolution_cache_storage', lambda: (resolution_cache.ping(), resolution_cache.path))
+    
+    def worker_pool_check():
+        stats = worker_pool.get_stats()
+        return stats['queued'] < stats['max_queue'], {"queued": stats['queued'], "max_queue": stats['max_queue']}
+    health_monitor.add_readiness_check('worker_pool', worker_pool_check)
+    
+    if get_updates_request is not None:
+        def polling_check():
+            running = application.updater is not None and application.updater.running
+            return running, {"running": running}
+        last_poll = lambda: get_updates_request.last_success.get('getUpdates')
+        health_monitor.add_readiness_check('polling', polling_check)
+        health_monitor.add_readiness_check(
+            'get_updates_age', age_check(last_poll, HEALTH_MAX_POLL_AGE, health_monitor))
+        health_monitor.add_liveness_check(
+            'get_updates_age', age_check(last_poll, HEALTH_LIVENESS_POLL_AGE, health_monitor, startup_grace=True))
+    else:
+        health_monitor.add_readiness_check('application', lambda: (application.running, {"running": application.running}))
+
+def is_admin_query(query):
+    """Check admin user ID passed in the query string"""
+    params = urllib.parse.parse_qs(query)
+    user_id = params.get('user_id', [None])[0]
+    return bool(user_id) and is_admin_user(int(user_id))
+
+def handle_admin_access(query):
+    """Handle admin panel access with user ID verification"""
+    try:
+        if not is_admin_query(query):
+            return http_text(403, "Access denied. Admin privileges required.")
+        return 200, 'text/html; charset=utf-8', ADMIN_PAGE_HTML.encode('utf-8')
+    except Exception as e:
+        return http_text(500, f"Error accessing admin panel: {str(e)}")
+
+def handle_admin_api_access(query, api_type):
+    """Handle admin API access with user ID verification"""
+    try:
+        if not is_admin_query(query):
+            return http_text(403, "Access denied. Admin privileges required.")
+        
+        if api_type == "stats":
+            return get_json_stats()
+        elif api_type == "user":
+            return get_user_stats(query)
+        elif api_type == "breakers":
+            # Circuit state, adaptive timeout and p95 per outbound host and API
+            return http_json(endpoint_health.get_stats())
+        return http_text(404, "API endpoint not found")
+    except Exception as e:
+        return http_text(500, f"Error accessing admin API: {str(e)}")
+
+def get_json_stats():
+    """JSON statistics"""
+    try:
+        # Copy: the aggregates snapshot is shared until the next event batch
+        stats = dict(analytics_aggregates.get_global_stats())
+        stats['resolution_cache'] = resolution_cache.get_stats()
+        stats['worker_pool'] = worker_pool.get_stats()
+        stats['google_maps_api'] = places_client.get_stats()
+        stats['resolution'] = resolution_stats.get_stats()
+        stats['strategies'] = strategy_stats.get_stats()
+        stats['short_url_expansion'] = short_url_expander.get_stats()
+        stats['analytics_sink'] = analytics_sink.get_stats()
+        stats['update_processor'] = update_processor.get_stats()
+        stats['rate_limits'] = {
+            "users": user_limiter.get_stats(),
+            "chats": chat_limiter.get_stats(),
+            "outbound": outbound_budget.get_stats()
+        }
+        if web_server is not None:
+            stats['webhook'] = web_server.get_stats()
+        return http_json(stats)
+    except Exception as e:
+        return http_text(500, f"Error getting stats: {str(e)}")
+
+def get_user_stats(query):
+    """User-specific statistics"""
+    try:
+        params = urllib.parse.parse_qs(query)
+        search_user_id = params.get('search_user_id', [None])[0]
+        
+        if not search_user_id:
+            return http_text(400, "Search User ID required")
+        
+        user_stats = analytics_aggregates.get_user_stats(int(search_user_id))
+        if user_stats is not None and user_stats['language'] is None:
+            # No language change in the replayed history; the stored preference still applies
+            user_stats['language'] = preferences_store.get_language(int(search_user_id))
+        return http_json(user_stats)
+    except Exception as e:
+        return http_text(500, f"Error getting user stats: {str(e)}")
+
+class HealthCheckHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        """Handle health check requests and analytics"""
         try:
-            from analytics import BotAnalytics
-            params = urllib.parse.parse_qs(query)
-            search_user_id = params.get('search_user_id', [None])[0]
-            
-            if not search_user_id:
-                self.send_error(400, "Search User ID required")
-                return
-            
-            analytics = BotAnalytics()
-            user_stats = analytics.get_user_stats(int(search_user_id))
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
+            parsed_path = urllib.parse.urlparse(self.path)
+            status, content_type, body, headers = handle_http_get(parsed_path.path, parsed_path.query, self.headers)
+            self.send_response(status)
+            self.send_header('Content-type', content_type)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            if status != 304:
+                self.send_header('Content-Length', str(len(body)))
             self.end_headers()
-            self.wfile.write(json.dumps(user_stats, indent=2).encode('utf-8'))
-            
+            self.wfile.write(body)
         except Exception as e:
-            self.send_error(500, f"Error getting user stats: {str(e)}")
-    
-
+            self.send_error(500, f"Internal Server Error: {str(e)}")
     
     def log_message(self, format, *args):
         # Suppress HTTP server logs
@@ -1456,40 +1534,41 @@ def run_http_server():
     port = int(os.getenv('PORT', 8081))
     server = HTTPServer(('', port), HealthCheckHandler)
     print(f"🌐 HTTP server started on port {port}")
+    server.serve_forever()
+
+def run_webhook(application, webhook_url):
+    """Serve Telegram updates via webhook on the Application's event loop"""
+    import signal
     
-    # Start a background thread to ping health check periodically
-    def ping_health_check():
-        import time
-        import requests
-        while True:
-            try:
-                requests.get(f'http://localhost:{port}/health', timeout=5)
-                print(f"💓 Internal health check ping at {time.strftime('%H:%M:%S')}")
-                time.sleep(15)  # Ping every 15 seconds for more aggressive keep-alive
-            except Exception as e:
-                print(f"⚠️ Internal health check failed: {e}")
-                time.sleep(15)
-    
-    # Start a background thread to ping external health check (disabled due to SSL issues)
-    def ping_external_health():
-        import time
-        while True:
-            try:
-                # Just log that we're alive, don't make external requests
-                print(f"💚 Bot is alive at {time.strftime('%H:%M:%S')}")
-                time.sleep(60)  # Log every minute
-            except Exception as e:
-                print(f"⚠️ Health check error: {e}")
-                time.sleep(60)
-    
-    import threading
-    ping_thread = threading.Thread(target=ping_health_check, daemon=True)
-    ping_thread.start()
-    
-    external_ping_thread = threading.Thread(target=ping_external_health, daemon=True)
-    external_ping_thread.start()
+    port = int(os.getenv('PORT', 8081))
+    secret_token = os.getenv('WEBHOOK_SECRET') or None
+    
+    async def serve():
+        global web_server
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+        
+        web_server = WebServer(application, handle_http_get, port, secret_token=secret_token)
+        async with application:
+            await application.start()
+            await web_server.start()
+            await application.bot.set_webhook(
+                url=f"{webhook_url.rstrip('/')}/webhook",
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+                secret_token=secret_token
+            )
+            print(f"🚀 Bot started with webhook on port {port}")
+            
+            await stop_event.wait()
+            print("\n🛑 Received shutdown signal. Stopping bot gracefully...")
+            await web_server.stop()
+            await application.stop()
+        await on_shutdown(application)
     
-    server.serve_forever()
+    asyncio.run(serve())
 
 def main():
     """Start the bot"""
@@ -1499,11 +1578,17 @@ def main():
     # Handle graceful shutdown
     def signal_handler(sig, frame):
         print("\n🛑 Received shutdown signal. Stopping bot gracefully...")
+        preferences_store.close()
+        analytics_sink.close()
         sys.exit(0)
     
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
+    # Report incomplete translations now rather than as "Missing translation" replies
+    for problem in validate_translations():
+        print(f"⚠️ Translation problem: {problem}")
+    
     # Get bot token from environment variable
     token = os.getenv('TELEGRAM_BOT_TOKEN')
     
@@ -1516,13 +1601,38 @@ def main():
         run_http_server()
         return
     
-    # Start HTTP server in a separate thread for Cloud Run health checks (only if not in production)
-    if os.getenv('ENVIRONMENT') != 'production':
+    # Webhook mode when a public URL is configured, polling otherwise
+    webhook_url = os.getenv('WEBHOOK_URL')
+    
+    # Start HTTP server in a separate thread for health probes, /metrics and admin routes
+    # (HEALTH_SERVER=off turns it off). In webhook mode the async web server serves these routes itself
+    if not webhook_url and os.getenv('HEALTH_SERVER', 'on').lower() != 'off':
         http_thread = threading.Thread(target=run_http_server, daemon=True)
         http_thread.start()
     
+    # Load user preferences and warm the short URL resolution cache from disk
+    preferences_store.load()
+    resolution_cache.load()
+    replay_since = time.time() - ANALYTICS_REPLAY_DAYS * 86400
+    analytics_aggregates.apply_batch(analytics_sink.writer.read_events(replay_since))
+    analytics_sink.start()
+    
     # Create the Application with better error handling and unique identifier
-    application = Application.builder().token(token).build()
+    # Bot API requests are timed for /metrics (same pool size as the builder default)
+    builder = Application.builder().token(token).post_shutdown(on_shutdown)
+    builder = builder.request(InstrumentedRequest(connection_pool_size=256))
+    # One slow chat must not hold up the others, in both modes
+    builder = builder.concurrent_updates(update_processor)
+    get_updates_request = None
+    if webhook_url:
+        # Bounded queue between the webhook and the update processor
+        builder = builder.update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE))
+    else:
+        # Polling: readiness tracks the last successful getUpdates
+        get_updates_request = InstrumentedRequest()
+        builder = builder.get_updates_request(get_updates_request)
+    application = builder.build()
+    register_health_checks(application, get_updates_request)
     
     # Add handlers
     application.add_handler(CommandHandler("start", start))
@@ -1537,12 +1647,14 @@ def main():
     # Add error handler
     application.add_error_handler(error_handler)
     
+    if webhook_url:
+        run_webhook(application, webhook_url)
+        return
+    
     # Use polling for both local and Cloud Run (simpler and more reliable)
     print("🤖 Bot started with polling!")
     
     # Add a small delay to reduce conflicts between instances
-    import time
-    import random
     time.sleep(random.uniform(0, 2))
     
     # Set bot name (skip for now to avoid conflicts)
@@ -1582,24 +1694,14 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     lang = get_user_language(user_id)
     
     # Create unique callback identifier to prevent duplicates
-    callback_id = f"{user_id}_{query.id}_{query.data}"
+    callback_id = ('callback', query.id, query.data)
     
     print(f"🔘 BUTTON callback received: {query.data} from user {user_id} (id: {query.id})")
     
     # Check if this callback was already processed
-    if hasattr(context, 'processed_callbacks'):
-        if callback_id in context.processed_callbacks:
-            print(f"⚠️ DUPLICATE callback detected: {callback_id}")
-            return
-    else:
-        context.processed_callbacks = set()
-    
-    # Add to processed callbacks
-    context.processed_callbacks.add(callback_id)
-    
-    # Clean up old callbacks (keep only last 50)
-    if len(context.processed_callbacks) > 50:
-        context.processed_callbacks = set(list(context.processed_callbacks)[-25:])
+    if update_deduplicator.seen(callback_id):
+        print(f"⚠️ DUPLICATE callback detected: {callback_id}")
+        return
     
     # Try to answer callback query, but don't fail if it's too old
     try:
@@ -1612,8 +1714,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     
     # Track analytics
-    if ANALYTICS_AVAILABLE and analytics:
-        analytics.track_user_interaction(user_id, f"button_{query.data}", True)
+    analytics_sink.track_user_interaction(user_id, f"button_{query.data}", True)
     
     # Process the callback based on data
     try:
@@ -1653,8 +1754,7 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 save_user_language(user_id, selected_lang)
                 
                 # Track language change
-                if ANALYTICS_AVAILABLE and analytics:
-                    analytics.track_language_change(user_id, selected_lang)
+                analytics_sink.track_language_change(user_id, selected_lang)
                 
                 language_name = get_language_name(selected_lang)
                 success_message = get_text('language_changed', selected_lang, language=language_name)
@@ -1670,10 +1770,20 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         print(f"❌ Callback data: {query.data}")
         print(f"❌ User ID: {user_id}")
 
+async def on_shutdown(application: Application) -> None:
+    """Close shared HTTP connection pools and caches on shutdown"""
+    await short_url_expander.aclose()
+    http_session.close()
+    resolution_cache.close()
+    preferences_store.close()
+    analytics_sink.close()
+    worker_pool.shutdown()
+
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle errors in the bot"""
     print(f"❌ Error: {context.error}")
     print(f"❌ Error type: {type(context.error)}")
+    metrics.errors.inc(type(context.error).__name__)
     print(f"❌ Update: {update}")
     
     # Handle different types of updates
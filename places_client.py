@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Google Maps API client for Maps to Waze Bot
+One process-wide client with cached place and text search lookups
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from endpoint_health import EndpointHealth, endpoint_health
+from resolution_cache import TTLCache
+
+# Google Maps API
+try:
+    import googlemaps
+    GOOGLE_MAPS_API_AVAILABLE = True
+except ImportError:
+    GOOGLE_MAPS_API_AVAILABLE = False
+    googlemaps = None
+
+logger = logging.getLogger(__name__)
+
+Location = Tuple[Optional[float], Optional[float]]
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _location_from_result(result: Dict[str, Any]) -> Location:
+    location = result.get('geometry', {}).get('location', {})
+    lat = location.get('lat')
+    lng = location.get('lng')
+    if lat is None or lng is None:
+        return None, None
+    return lat, lng
+
+
+class _ThreadTimeoutSession(requests.Session):
+    """HTTP session whose timeout is set per calling thread (googlemaps fixes it per client)"""
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    def request(self, method, url, **kwargs):
+        timeout = getattr(self.local, 'timeout', None)
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        return super().request(method, url, **kwargs)
+
+
+def normalize_query(query: str) -> str:
+    """Normalize text search query for use as cache key"""
+    return _WHITESPACE_RE.sub(' ', query.replace('+', ' ')).strip().lower()
+
+
+class PlacesClient:
+    """
+    Shared googlemaps.Client (keeps its HTTP session) with TTL/LRU response
+    caches. Each API is an endpoint with an adaptive timeout (at most
+    `timeout`) and a circuit breaker: while it is open, cached answers are
+    still served and uncached calls raise CircuitOpenError. With a budget,
+    every uncached API call takes a token from it first (budget.acquire
+    raises when it is exhausted).
+    """
+
+    def __init__(self, timeout: float = 2, cache_size: int = 10000,
+                 ttl: float = 7 * 24 * 3600, negative_ttl: float = 3600,
+                 health: Optional[EndpointHealth] = None):
+        self.timeout = timeout
+        self.budget = None
+        self.health = health or EndpointHealth()
+        self._session = _ThreadTimeoutSession()
+        self._client = None
+        self._api_key = None
+        self._lock = threading.Lock()
+        self.place_cache = TTLCache(max_size=cache_size, ttl=ttl, negative_ttl=negative_ttl)
+        self.search_cache = TTLCache(max_size=cache_size, ttl=ttl, negative_ttl=negative_ttl)
+        self.calls = {'place_api': 0, 'text_search': 0}  # API calls sent, by kind
+
+    def get_client(self):
+        """Create the client once; returns None if the API is unavailable or no key is set"""
+        if self._client is not None:
+            return self._client
+        if not GOOGLE_MAPS_API_AVAILABLE:
+            return None
+        with self._lock:
+            if self._client is None:
+                if self._api_key is None:
+                    self._api_key = os.getenv('GOOGLE_MAPS_API_KEY', '')
+                if not self._api_key:
+                    return None
+                # Retries stop after `timeout` seconds so failures reach the breaker
+                self._client = googlemaps.Client(key=self._api_key, timeout=self.timeout,
+                                                 retry_timeout=self.timeout, requests_session=self._session)
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return self.get_client() is not None
+
+    def place_location(self, place_id: str, context=None) -> Location:
+        """Location for a place ID (cached, including misses); API calls are traced on context"""
+        cached = self.place_cache.get(place_id)
+        if cached is not None:
+            return cached
+        client = self.get_client()
+        if client is None:
+            return None, None
+        place_details = self._call('place_api', context, client.place, place_id)
+        location = (None, None)
+        if place_details and 'result' in place_details:
+            location = _location_from_result(place_details['result'])
+        self.place_cache.set(place_id, location, negative=location[0] is None)
+        return location
+
+    def text_search_location(self, query: str, context=None) -> Location:
+        """Location of the first text search result (cached, including misses); API calls are traced on context"""
+        key = normalize_query(query)
+        cached = self.search_cache.get(key)
+        if cached is not None:
+            return cached
+        client = self.get_client()
+        if client is None:
+            return None, None
+        search_result = self._call('text_search', context, client.places, query)
+        location = (None, None)
+        if search_result and search_result.get('results'):
+            location = _location_from_result(search_result['results'][0])
+        self.search_cache.set(key, location, negative=location[0] is None)
+        return location
+
+    def _call(self, kind: str, context, func, *args):
+        """One API call with breaker check, budget token and adaptive timeout; traced on context"""
+        endpoint = self.health.endpoint(kind, self.timeout)
+        endpoint.guard()
+        if self.budget is not None:
+            self.budget.acquire(kind)
+        self.calls[kind] += 1
+        self._session.local.timeout = endpoint.timeout()
+        started = time.monotonic()
+        try:
+            result = func(*args)
+        except (googlemaps.exceptions.Timeout, googlemaps.exceptions.TransportError,
+                googlemaps.exceptions.HTTPError):
+            endpoint.record_failure(time.monotonic() - started)
+            raise
+        except googlemaps.exceptions.ApiError as e:
+            # INVALID_REQUEST, NOT_FOUND and the like: the endpoint answered, so the
+            # breaker sees a success and the caller caches the miss instead of paying again
+            logger.info(f"{kind} API error: {e}")
+            result = None
+        finally:
+            if context is not None:
+                context.add_round_trip(kind, time.monotonic() - started)
+        endpoint.record_success(time.monotonic() - started)
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """API calls made and avoided, for admin stats"""
+        place_stats = self.place_cache.get_stats()
+        search_stats = self.search_cache.get_stats()
+        return {
+            "place_api_calls": self.calls['place_api'],
+            "text_search_api_calls": self.calls['text_search'],
+            "place_calls_saved": place_stats['hits'] + place_stats['negative_hits'],
+            "text_search_calls_saved": search_stats['hits'] + search_stats['negative_hits'],
+            "place_cache": place_stats,
+            "text_search_cache": search_stats
+        }
+
+
+# Process-wide Google Maps API client
+places_client = PlacesClient(health=endpoint_health)
@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+User preferences storage for Maps to Waze Bot
+Pluggable backends: JSON file (compatible) and SQLite (scales to millions of users)
+"""
+
+import abc
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker for "user has no stored preference" in the SQLite read cache
+_MISSING = object()
+
+
+class PreferencesStore(abc.ABC):
+    """Base class for preference backends: memory-served reads, debounced batched writes"""
+
+    def __init__(self, flush_delay: float = 2.0):
+        self.flush_delay = flush_delay
+        self._lock = threading.RLock()
+        self._timer: Optional[threading.Timer] = None
+
+    @abc.abstractmethod
+    def load(self):
+        """Open the backend; called once at startup"""
+
+    @abc.abstractmethod
+    def get_language(self, user_id: int, default: str = 'en') -> str:
+        """Get user's language"""
+
+    @abc.abstractmethod
+    def set_language(self, user_id: int, language: str):
+        """Update user's language; persisted by the next flush"""
+
+    @abc.abstractmethod
+    def flush(self):
+        """Write pending changes"""
+
+    def close(self):
+        """Flush and release resources"""
+        self.flush()
+
+    @abc.abstractmethod
+    def ping(self) -> bool:
+        """Check that the backend can be written (readiness probe)"""
+
+    def _schedule_flush(self):
+        """Debounce: restart the timer so bursts of changes cause one write"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+class JsonPreferencesStore(PreferencesStore):
+    """All preferences in memory, written back to a JSON file with atomic rename"""
+
+    def __init__(self, path: str = 'user_preferences.json', flush_delay: float = 2.0):
+        super().__init__(flush_delay)
+        self.path = path
+        self._preferences: Dict[str, str] = {}
+        self._loaded = False
+        self._dirty = False
+
+    def load(self):
+        """Read the preferences file once"""
+        with self._lock:
+            self._preferences = read_json_preferences(self.path)
+            self._loaded = True
+            logger.info(f"Loaded {len(self._preferences)} user preferences from {self.path}")
+
+    def get_language(self, user_id: int, default: str = 'en') -> str:
+        if not self._loaded:
+            self.load()
+        return self._preferences.get(str(user_id), default)
+
+    def set_language(self, user_id: int, language: str):
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            if self._preferences.get(str(user_id)) == language:
+                return
+            self._preferences[str(user_id)] = language
+            self._dirty = True
+            self._schedule_flush()
+
+    def flush(self):
+        """Write pending changes to disk (tmp file + atomic rename)"""
+        with self._lock:
+            self._cancel_flush()
+            if not self._dirty:
+                return
+            data = json.dumps(self._preferences, ensure_ascii=False, indent=2)
+            try:
+                self._write_atomic(data)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"Error saving user preferences: {e}")
+
+    def _write_atomic(self, data: str):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(prefix='.user_preferences.', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.replace(tmp_path, self.path)
+                return
+            except OSError:
+                # A file bind-mounted into the container (docker-compose.yml)
+                # cannot be renamed over; fall back to rewriting it in place
+                pass
+            with open(self.path, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def ping(self) -> bool:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        if os.path.exists(self.path):
+            return os.access(self.path, os.W_OK)
+        return os.access(directory, os.W_OK)
+
+    def __len__(self) -> int:
+        return len(self._preferences)
+
+
+class SqlitePreferencesStore(PreferencesStore):
+    """
+    Preferences in a WAL-mode SQLite database with a bounded LRU read cache.
+    Memory stays bounded by cache_size regardless of the number of users.
+    """
+
+    # Constant SQL strings, so sqlite3 reuses the prepared statements
+    _SELECT_SQL = 'SELECT language FROM user_preferences WHERE user_id = ?'
+    _UPSERT_SQL = 'INSERT OR REPLACE INTO user_preferences (user_id, language) VALUES (?, ?)'
+    _IMPORT_SQL = 'INSERT OR IGNORE INTO user_preferences (user_id, language) VALUES (?, ?)'
+
+    def __init__(self, path: str = 'data/bot_state.sqlite3', json_path: Optional[str] = 'user_preferences.json',
+                 cache_size: int = 100000, flush_delay: float = 2.0):
+        super().__init__(flush_delay)
+        self.path = path
+        self.json_path = json_path
+        self.cache_size = cache_size
+        self._db: Optional[sqlite3.Connection] = None
+        self._cache = OrderedDict()  # user_id -> language or _MISSING
+        self._pending: Dict[int, str] = {}
+
+    def load(self):
+        """Open the database, create the schema and migrate the JSON file once"""
+        with self._lock:
+            if self._db is not None:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None,
+                                 cached_statements=32)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS user_preferences ('
+                'user_id INTEGER PRIMARY KEY, language TEXT NOT NULL)'
+            )
+            db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self._db = db
+            if self.json_path:
+                migrate_json_preferences(self.json_path, self)
+            logger.info(f"Opened preferences database {self.path}")
+
+    def get_language(self, user_id: int, default: str = 'en') -> str:
+        user_id = int(user_id)
+        with self._lock:
+            language = self._pending.get(user_id)
+            if language is not None:
+                return language
+            language = self._cache.get(user_id)
+            if language is not None:
+                self._cache.move_to_end(user_id)
+            else:
+                if self._db is None:
+                    self.load()
+                row = self._db.execute(self._SELECT_SQL, (user_id,)).fetchone()
+                language = row[0] if row else _MISSING
+                self._remember(user_id, language)
+            return default if language is _MISSING else language
+
+    def set_language(self, user_id: int, language: str):
+        user_id = int(user_id)
+        with self._lock:
+            self._pending[user_id] = language
+            self._remember(user_id, language)
+            self._schedule_flush()
+
+    def _remember(self, user_id: int, language):
+        self._cache[user_id] = language
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def flush(self):
+        """Write pending changes in one transaction"""
+        with self._lock:
+            self._cancel_flush()
+            if not self._pending:
+                return
+            if self._db is None:
+                self.load()
+            try:
+                self._db.execute('BEGIN')
+                self._db.executemany(self._UPSERT_SQL, self._pending.items())
+                self._db.execute('COMMIT')
+                self._pending.clear()
+            except sqlite3.Error as e:
+                self._db.execute('ROLLBACK')
+                logger.error(f"Error saving user preferences: {e}")
+
+    def import_preferences(self, preferences: Dict[str, str]) -> int:
+        """Bulk insert without overwriting values already in the database"""
+        rows = [(int(user_id), language) for user_id, language in preferences.items()]
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany(self._IMPORT_SQL, rows)
+            self._db.execute('COMMIT')
+        return len(rows)
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def close(self):
+        with self._lock:
+            self.flush()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def ping(self) -> bool:
+        with self._lock:
+            if self._db is None:
+                return False
+            try:
+                self._db.execute('SELECT 1').fetchone()
+                return True
+            except sqlite3.Error:
+                return False
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._db is None:
+                self.load()
+            return self._db.execute('SELECT COUNT(*) FROM user_preferences').fetchone()[0]
+
+
+def read_json_preferences(path: str) -> Dict[str, str]:
+    """Read the legacy JSON preferences file"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return {str(k): v for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+    except json.JSONDecodeError as e:
+        logger.error(f"Corrupted preferences file {path}: {e}")
+        return {}
+
+
+def migrate_json_preferences(json_path: str, store: SqlitePreferencesStore):
+    """One-shot migration of the JSON preferences file into SQLite"""
+    if store.get_meta('json_migrated') or not os.path.exists(json_path):
+        return
+    count = store.import_preferences(read_json_preferences(json_path))
+    store.set_meta('json_migrated', json_path)
+    logger.info(f"Migrated {count} user preferences from {json_path} to {store.path}")
+
+
+def create_preferences_store() -> PreferencesStore:
+    """Create the backend selected by PREFERENCES_BACKEND (json or sqlite)"""
+    backend = os.getenv('PREFERENCES_BACKEND', 'json').lower()
+    json_path = os.getenv('PREFERENCES_FILE', 'user_preferences.json')
+    if backend == 'sqlite':
+        return SqlitePreferencesStore(
+            path=os.getenv('PREFERENCES_DB', 'data/bot_state.sqlite3'),
+            json_path=json_path
+        )
+    return JsonPreferencesStore(path=json_path)
+
+
+# Process-wide preferences store
+preferences_store = create_preferences_store()
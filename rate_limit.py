@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Rate limiting for Maps to Waze Bot
+Token buckets per user and chat, and a global budget for outbound fetches and API calls
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Hashable
+
+from worker_pool import PoolBusyError
+
+# allowed: go ahead; retry_after: seconds until a token is available;
+# notify: first rejection since the key was last allowed (reply once, not per message)
+RateDecision = namedtuple('RateDecision', ['allowed', 'retry_after', 'notify'])
+
+
+class OutboundBudgetExhausted(PoolBusyError):
+    """Raised when the global outbound budget has no tokens; handled like a busy pool"""
+
+
+class KeyedRateLimiter:
+    """
+    One token bucket per key: `rate` tokens per second up to `burst`.
+    Buckets live in an LRU map capped at max_keys, so memory is bounded;
+    an evicted key starts again with a full bucket. Used from the event
+    loop only, so there is no locking.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, monotonic timestamp, rejected since last allow]
+        self.allowed = 0
+        self.rejected = 0
+
+    def check(self, key: Hashable, cost: float = 1) -> RateDecision:
+        now = time.monotonic()
+        buckets = self._buckets
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [self.burst, now, False]
+            if len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            bucket[2] = False
+            self.allowed += 1
+            return RateDecision(True, 0.0, False)
+        notify = not bucket[2]
+        bucket[2] = True
+        self.rejected += 1
+        return RateDecision(False, (cost - bucket[0]) / self.rate, notify)
+
+    def refund(self, key: Hashable, cost: float = 1):
+        """Give back tokens taken by an allowed check() whose request was rejected elsewhere"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket[0] = min(self.burst, bucket[0] + cost)
+            self.allowed -= 1
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"keys": len(self._buckets), "allowed": self.allowed, "rejected": self.rejected}
+
+
+class OutboundBudget:
+    """Global token bucket shared by the event loop and worker threads"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.spent: Dict[str, int] = {}
+        self.rejected: Dict[str, int] = {}
+
+    def try_acquire(self, kind: str) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.spent[kind] = self.spent.get(kind, 0) + 1
+                return True
+            self.rejected[kind] = self.rejected.get(kind, 0) + 1
+            return False
+
+    def acquire(self, kind: str):
+        """Take one token or raise OutboundBudgetExhausted"""
+        if not self.try_acquire(kind):
+            raise OutboundBudgetExhausted(f"Outbound budget exhausted ({kind})")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"tokens": round(self._tokens, 1), "burst": self.burst, "rate_per_second": self.rate,
+                    "spent": dict(self.spent), "rejected": dict(self.rejected)}
+
+
+# Process-wide limiters; rates are per minute for users and chats, per second for outbound calls
+user_limiter = KeyedRateLimiter(
+    rate=float(os.getenv('USER_RATE_PER_MINUTE', 20)) / 60,
+    burst=float(os.getenv('USER_RATE_BURST', 5)))
+chat_limiter = KeyedRateLimiter(
+    rate=float(os.getenv('CHAT_RATE_PER_MINUTE', 60)) / 60,
+    burst=float(os.getenv('CHAT_RATE_BURST', 20)))
+outbound_budget = OutboundBudget(
+    rate=float(os.getenv('OUTBOUND_RATE_PER_SECOND', 20)),
+    burst=float(os.getenv('OUTBOUND_BURST', 50)))
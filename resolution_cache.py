@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+Resolution caches for Maps to Waze Bot
+TTL + LRU caches with negative results and optional SQLite persistence
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Cached result of resolving a short link; lat/lng are None for negative results
+CachedResolution = namedtuple('CachedResolution', ['lat', 'lng', 'expanded_url'])
+
+
+def normalize_short_url(url: str) -> str:
+    """Normalize short URL for use as cache key (host case, query, trailing slash)"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    path = parts.path.rstrip('/')
+    return f"{host}{path}"
+
+
+class TTLCache:
+    """In-memory LRU cache with per-entry TTL and shorter TTL for negative results"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 7 * 24 * 3600,
+                 negative_ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value, negative)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return cached value (refreshing its LRU position) or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value, negative = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                self._on_delete(key)
+                return None
+            self._entries.move_to_end(key)
+            if negative:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, negative: bool = False):
+        """Store value; negative results expire after negative_ttl"""
+        expires_at = time.time() + (self.negative_ttl if negative else self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value, negative)
+            self._entries.move_to_end(key)
+            self._on_set(key, expires_at, value, negative)
+            while len(self._entries) > self.max_size:
+                evicted_key, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                self._on_delete(evicted_key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for admin stats"""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    # Persistence hooks, called with the lock held
+    def _on_set(self, key: str, expires_at: float, value: Any, negative: bool):
+        pass
+
+    def _on_delete(self, key: str):
+        pass
+
+
+class ResolutionCache(TTLCache):
+    """
+    Short URL -> coordinates cache persisted to SQLite so restarts start warm.
+    Changes are collected in memory and written in one transaction by a
+    timer thread at most flush_delay seconds later, so the event loop
+    never waits for the disk.
+    """
+
+    _UPSERT_SQL = 'INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?, ?, ?)'
+    _DELETE_SQL = 'DELETE FROM resolutions WHERE key = ?'
+
+    def __init__(self, path: Optional[str] = None, flush_delay: float = 2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.flush_delay = flush_delay
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._pending: Dict[str, Optional[tuple]] = {}  # key -> row to write, None to delete
+        self._timer: Optional[threading.Timer] = None
+
+    def load(self):
+        """Open the SQLite file and warm the cache with non-expired entries"""
+        if not self.path:
+            return
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS resolutions ('
+                'key TEXT PRIMARY KEY, lat REAL, lng REAL, expanded_url TEXT, '
+                'negative INTEGER NOT NULL, expires_at REAL NOT NULL)'
+            )
+            now = time.time()
+            db.execute('DELETE FROM resolutions WHERE expires_at <= ?', (now,))
+            rows = db.execute(
+                'SELECT key, lat, lng, expanded_url, negative, expires_at FROM resolutions '
+                'ORDER BY expires_at DESC LIMIT ?', (self.max_size,)
+            ).fetchall()
+            with self._lock:
+                # Oldest first so the most recently stored entries end up most recent in LRU order
+                for key, lat, lng, expanded_url, negative, expires_at in reversed(rows):
+                    self._entries[key] = (expires_at, CachedResolution(lat, lng, expanded_url), bool(negative))
+                self._db = db
+            logger.info(f"Loaded {len(rows)} cached resolutions from {self.path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open resolution cache {self.path}: {e}")
+            self._db = None
+
+    def _on_set(self, key: str, expires_at: float, value: Any, negative: bool):
+        if self._db is None:
+            return
+        self._pending[key] = (key, value.lat, value.lng, value.expanded_url, int(negative), expires_at)
+        self._schedule_flush()
+
+    def _on_delete(self, key: str):
+        if self._db is None:
+            return
+        self._pending[key] = None
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Start the flush timer unless one is pending; later changes join its batch"""
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self):
+        """Write pending changes in one transaction"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        upserts = [row for row in pending.values() if row is not None]
+        deletes = [(key,) for key, row in pending.items() if row is None]
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute('BEGIN')
+                self._db.executemany(self._UPSERT_SQL, upserts)
+                self._db.executemany(self._DELETE_SQL, deletes)
+                self._db.execute('COMMIT')
+            except sqlite3.Error as e:
+                self._db.execute('ROLLBACK')
+                logger.warning(f"Could not persist {len(pending)} cached resolutions: {e}")
+
+    def ping(self) -> bool:
+        """Check the SQLite file is usable (readiness probe); True when not persisted"""
+        if not self.path:
+            return True
+        with self._db_lock:
+            if self._db is None:
+                return False
+            try:
+                self._db.execute('SELECT 1').fetchone()
+                return True
+            except sqlite3.Error:
+                return False
+
+    def close(self):
+        """Write pending changes and close the SQLite connection"""
+        self.flush()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+# Process-wide short URL resolution cache (persistent once load() is called)
+resolution_cache = ResolutionCache(path=os.getenv('RESOLUTION_CACHE_PATH', 'data/resolution_cache.sqlite3'))
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Resolution context for Maps to Waze Bot
+Per-request state shared by every step of resolving one link
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import stage_latency
+
+logger = logging.getLogger(__name__)
+
+# Marker for values not computed yet (None is a valid computed value)
+UNSET = object()
+
+# Round-trip kind -> metrics stage name
+ROUND_TRIP_STAGES = {
+    'expand': 'short_url_expand',
+    'place_api': 'place_api',
+    'text_search': 'text_search'
+}
+
+
+class ResolutionContext:
+    """
+    Carries the expanded URL, what it encodes (MapsData), place id and
+    place name through the pipeline so each network fetch happens at most
+    once per request, and records every round trip for tracing.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.expanded_url: Optional[str] = None
+        self.maps_data = None  # MapsData decoded from the expanded URL
+        self.place_id: Any = UNSET
+        self.place_name: Any = UNSET
+        self.round_trips: List[Tuple[str, float]] = []  # (kind, seconds)
+        self._started = time.monotonic()
+
+    def add_round_trip(self, kind: str, seconds: float):
+        """Record one network round trip (expansion, place API, text search)"""
+        self.round_trips.append((kind, seconds))
+        stage_latency.observe(ROUND_TRIP_STAGES.get(kind, kind), seconds)
+
+    def finish(self, found: bool):
+        """Log the trace and add it to the aggregate statistics"""
+        elapsed = time.monotonic() - self._started
+        trace = ', '.join(f"{kind} {seconds * 1000:.0f}ms" for kind, seconds in self.round_trips)
+        logger.info(f"Resolved {self.url} in {len(self.round_trips)} round trips "
+                    f"({elapsed * 1000:.0f}ms, found={found}): {trace or 'no network'}")
+        resolution_stats.record(self, found)
+
+
+class ResolutionStats:
+    """Aggregate round-trip counts per resolution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.resolutions = 0
+        self.found = 0
+        self.round_trips = 0
+        self.max_round_trips = 0
+        self.round_trips_by_kind = Counter()
+        self.round_trip_histogram = Counter()
+
+    def record(self, context: ResolutionContext, found: bool):
+        count = len(context.round_trips)
+        with self._lock:
+            self.resolutions += 1
+            self.found += int(found)
+            self.round_trips += count
+            self.max_round_trips = max(self.max_round_trips, count)
+            self.round_trip_histogram[count] += 1
+            for kind, _ in context.round_trips:
+                self.round_trips_by_kind[kind] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "resolutions": self.resolutions,
+                "found": self.found,
+                "round_trips": self.round_trips,
+                "avg_round_trips": round(self.round_trips / self.resolutions, 3) if self.resolutions else 0.0,
+                "max_round_trips": self.max_round_trips,
+                "round_trips_by_kind": dict(self.round_trips_by_kind),
+                "round_trip_histogram": {str(k): v for k, v in sorted(self.round_trip_histogram.items())}
+            }
+
+
+# Process-wide resolution statistics
+resolution_stats = ResolutionStats()
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Strategy racing for Maps to Waze Bot
+Hedged, staggered resolution strategies where the first valid result wins
+"""
+
+import asyncio
+import logging
+import threading
+from collections import namedtuple
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from metrics import registry, Histogram
+from worker_pool import PoolBusyError
+
+logger = logging.getLogger(__name__)
+
+# name: for statistics; run: () -> awaitable result; delay: seconds after the
+# race starts before this strategy is launched (0 for the primary)
+Strategy = namedtuple('Strategy', ['name', 'run', 'delay'])
+
+OUTCOMES = ('wins', 'misses', 'errors', 'cancelled')
+
+
+def valid_location(result) -> bool:
+    """A (lat, lng) pair within coordinate ranges"""
+    if not result or result[0] is None or result[1] is None:
+        return False
+    return -90 <= result[0] <= 90 and -180 <= result[1] <= 180
+
+
+class StrategyStats:
+    """Launches, outcomes and latency per strategy, for tuning order and hedge delays"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = {}
+        self._total_seconds: Dict[str, float] = {}
+
+    def record(self, name: str, outcome: str, seconds: float):
+        """Count one finished strategy run; outcome is one of OUTCOMES"""
+        strategy_latency.observe(name, seconds)
+        with self._lock:
+            counts = self._counts.get(name)
+            if counts is None:
+                counts = self._counts[name] = dict.fromkeys(OUTCOMES, 0)
+                self._total_seconds[name] = 0.0
+            counts[outcome] += 1
+            self._total_seconds[name] += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {}
+            for name, counts in self._counts.items():
+                runs = sum(counts.values())
+                stats[name] = dict(counts, runs=runs,
+                                   win_rate=round(counts['wins'] / runs, 3) if runs else 0.0,
+                                   avg_ms=round(self._total_seconds[name] / runs * 1000, 1) if runs else 0.0)
+            return stats
+
+
+async def race(strategies: Sequence[Strategy], validate: Callable[[Any], bool] = valid_location,
+               stats: Optional['StrategyStats'] = None) -> Tuple[Optional[str], Any]:
+    """
+    Run strategies as a hedged race and return (winner name, result), or
+    (None, None) when none produced a valid result.
+
+    The first strategy starts at once and each later one when its delay
+    has passed or, earlier, as soon as everything launched so far has
+    failed. The first result passing validate wins and the others are
+    cancelled. If nothing wins and a strategy was rejected as busy, that
+    PoolBusyError is raised so the miss is not cached.
+    """
+    stats = stats or strategy_stats
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending: Dict[asyncio.Task, Tuple[Strategy, float]] = {}
+    next_index = 0
+    busy_error: Optional[PoolBusyError] = None
+    # One future per wait, resolved by whichever finishes first: a strategy
+    # or the next hedge timer (cheaper than asyncio.wait on the hot path)
+    wakeup: Optional[asyncio.Future] = None
+
+    def wake(_=None):
+        if wakeup is not None and not wakeup.done():
+            wakeup.set_result(None)
+
+    def launch(strategy: Strategy):
+        task = loop.create_task(strategy.run())
+        task.add_done_callback(wake)
+        pending[task] = (strategy, loop.time())
+
+    try:
+        while pending or next_index < len(strategies):
+            if not pending:
+                launch(strategies[next_index])
+                next_index += 1
+                continue
+
+            done = [task for task in pending if task.done()]
+            if not done:
+                wakeup = loop.create_future()
+                timer = None
+                if next_index < len(strategies):
+                    timer = loop.call_at(started + strategies[next_index].delay, wake)
+                try:
+                    await wakeup
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                done = [task for task in pending if task.done()]
+                if not done:
+                    # Hedge: the strategies in flight are taking longer than the next one's delay
+                    launch(strategies[next_index])
+                    next_index += 1
+                    continue
+
+            for task in done:
+                strategy, launched = pending.pop(task)
+                seconds = loop.time() - launched
+                error = task.exception()
+                if error is not None:
+                    if isinstance(error, PoolBusyError):
+                        busy_error = error
+                    else:
+                        logger.warning(f"Strategy {strategy.name} failed: {error}")
+                    stats.record(strategy.name, 'errors', seconds)
+                elif validate(task.result()):
+                    stats.record(strategy.name, 'wins', seconds)
+                    return strategy.name, task.result()
+                else:
+                    stats.record(strategy.name, 'misses', seconds)
+    finally:
+        for task, (strategy, launched) in pending.items():
+            task.cancel()
+            stats.record(strategy.name, 'cancelled', loop.time() - launched)
+
+    if busy_error is not None:
+        raise busy_error
+    return None, None
+
+
+# Process-wide strategy statistics and their latency histogram
+strategy_latency = registry.register(Histogram(
+    'waze_bot_strategy_duration_seconds', 'Latency of each resolution strategy until it finished or was cancelled',
+    'strategy'))
+strategy_stats = StrategyStats()
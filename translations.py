@@ -4,7 +4,8 @@ Translations for Maps to Waze Bot
 Supports: Russian, English, Ukrainian, Hebrew
 """
 
-from typing import Dict, Any
+from string import Formatter
+from typing import Any, Callable, Dict, List, Set, Union
 
 # Language codes
 LANGUAGES = {
@@ -100,6 +101,14 @@ TRANSLATIONS = {
             "• 31°44'49.8\"N 35°01'46.6\"E"
         ),
         'processing': "⏳ Обрабатываю ссылку...",
+        'error_busy': (
+            "⏳ Сейчас слишком много запросов.\n"
+            "Пожалуйста, отправьте ссылку ещё раз через несколько секунд."
+        ),
+        'error_rate_limited': "⏱️ Слишком много запросов. Попробуйте снова через {seconds} сек.",
+        'multiple_locations': "✅ Найдено мест: {count}\n\n{items}",
+        'location_item': "{index}. 📍 {lat}, {lng}\n🚗 {waze_url}",
+        'location_item_failed': "{index}. ❌ Координаты не найдены: {source}",
         'error_processing': (
             "❌ Произошла ошибка при обработке вашего сообщения.\n"
             "Пожалуйста, попробуйте еще раз или отправьте /help для справки."
@@ -201,6 +210,14 @@ TRANSLATIONS = {
             "• 31°44'49.8\"N 35°01'46.6\"E"
         ),
         'processing': "⏳ Processing link...",
+        'error_busy': (
+            "⏳ The bot is busy right now.\n"
+            "Please send the link again in a few seconds."
+        ),
+        'error_rate_limited': "⏱️ Too many requests. Please try again in {seconds} s.",
+        'multiple_locations': "✅ Found {count} locations:\n\n{items}",
+        'location_item': "{index}. 📍 {lat}, {lng}\n🚗 {waze_url}",
+        'location_item_failed': "{index}. ❌ No coordinates found: {source}",
         'error_processing': (
             "❌ An error occurred while processing your message.\n"
             "Please try again or send /help for assistance."
@@ -290,7 +307,26 @@ TRANSLATIONS = {
             "• 40.7128, -74.0060\n"
             "• 31°44'49.8\"N 35°01'46.6\"E"
         ),
+        'error_short_url': (
+            "🔗 Виявлено коротке посилання Google Maps\n\n"
+            "Щоб отримати координати:\n"
+            "1. Відкрийте посилання в браузері\n"
+            "2. Натисніть 'Поділитися' (Share)\n"
+            "3. Виберіть 'Копіювати посилання'\n"
+            "4. Надішліть нове посилання\n\n"
+            "Або надішліть координати напряму:\n"
+            "• 40.7128, -74.0060\n"
+            "• 31°44'49.8\"N 35°01'46.6\"E"
+        ),
         'processing': "⏳ Обробляю посилання...",
+        'error_busy': (
+            "⏳ Зараз забагато запитів.\n"
+            "Будь ласка, надішліть посилання ще раз за кілька секунд."
+        ),
+        'error_rate_limited': "⏱️ Забагато запитів. Спробуйте знову через {seconds} с.",
+        'multiple_locations': "✅ Знайдено місць: {count}\n\n{items}",
+        'location_item': "{index}. 📍 {lat}, {lng}\n🚗 {waze_url}",
+        'location_item_failed': "{index}. ❌ Координати не знайдено: {source}",
         'error_processing': (
             "❌ Сталася помилка при обробці вашого повідомлення.\n"
             "Будь ласка, спробуйте ще раз або надішліть /help для довідки."
@@ -380,7 +416,26 @@ TRANSLATIONS = {
             "• 40.7128, -74.0060\n"
             "• 31°44'49.8\"N 35°01'46.6\"E"
         ),
+        'error_short_url': (
+            "🔗 זוהה קישור מקוצר של Google Maps\n\n"
+            "כדי לקבל קואורדינטות:\n"
+            "1. פתח את הקישור בדפדפן\n"
+            "2. לחץ על 'שיתוף' (Share)\n"
+            "3. בחר 'העתק קישור'\n"
+            "4. שלח את הקישור החדש\n\n"
+            "או שלח קואורדינטות ישירות:\n"
+            "• 40.7128, -74.0060\n"
+            "• 31°44'49.8\"N 35°01'46.6\"E"
+        ),
         'processing': "⏳ מעבד קישור...",
+        'error_busy': (
+            "⏳ הבוט עמוס כרגע.\n"
+            "אנא שלח את הקישור שוב בעוד מספר שניות."
+        ),
+        'error_rate_limited': "⏱️ יותר מדי בקשות. נסה שוב בעוד {seconds} שניות.",
+        'multiple_locations': "✅ נמצאו {count} מיקומים:\n\n{items}",
+        'location_item': "{index}. 📍 {lat}, {lng}\n🚗 {waze_url}",
+        'location_item_failed': "{index}. ❌ לא נמצאו קואורדינטות: {source}",
         'error_processing': (
             "❌ אירעה שגיאה בעיבוד ההודעה שלך.\n"
             "אנא נסה שוב או שלח /help לעזרה."
@@ -399,31 +454,57 @@ TRANSLATIONS = {
     }
 }
 
+def _compile(template: str) -> Union[str, Callable[..., str]]:
+    """Pre-render a template without placeholders; otherwise return its bound format method"""
+    if any(field is not None for _, field, _, _ in Formatter().parse(template)):
+        return template.format
+    return template.format()
+
+def _compile_language(lang: str) -> Dict[str, Any]:
+    """Templates for one language, with English filling any missing keys"""
+    texts = {**TRANSLATIONS['en'], **TRANSLATIONS[lang]}
+    return {key: _compile(value) for key, value in texts.items() if isinstance(value, str)}
+
+# Compiled once at import: language -> key -> pre-rendered text or format function
+COMPILED_TEXTS = {lang: _compile_language(lang) for lang in TRANSLATIONS}
+BUTTON_TEXTS = {lang: {**TRANSLATIONS['en'].get('buttons', {}), **TRANSLATIONS[lang].get('buttons', {})}
+                for lang in TRANSLATIONS}
+
+def validate_translations() -> List[str]:
+    """Problems that would otherwise surface at runtime: missing languages, keys, buttons or placeholders"""
+    def fields(template: str) -> Set[str]:
+        return {field for _, field, _, _ in Formatter().parse(template) if field is not None}
+    
+    problems = []
+    reference = TRANSLATIONS['en']
+    for lang in LANGUAGES:
+        texts = TRANSLATIONS.get(lang)
+        if texts is None:
+            problems.append(f"{lang}: no translations")
+            continue
+        for key, value in reference.items():
+            if key not in texts:
+                problems.append(f"{lang}: missing key '{key}'")
+            elif key == 'buttons':
+                missing = sorted(set(value) - set(texts[key]))
+                if missing:
+                    problems.append(f"{lang}: missing buttons {missing}")
+            elif fields(texts[key]) != fields(value):
+                problems.append(f"{lang}: placeholders of '{key}' differ from English")
+    return problems
+
 def get_text(key: str, lang: str = 'en', **kwargs) -> str:
     """Get translated text for given key and language"""
-    if lang not in TRANSLATIONS:
-        lang = 'en'
-    
-    if key not in TRANSLATIONS[lang]:
-        # Fallback to English
-        if key in TRANSLATIONS['en']:
-            return TRANSLATIONS['en'][key].format(**kwargs)
+    template = COMPILED_TEXTS.get(lang, COMPILED_TEXTS['en']).get(key)
+    if template is None:
         return f"Missing translation: {key}"
-    
-    return TRANSLATIONS[lang][key].format(**kwargs)
+    if isinstance(template, str):
+        return template
+    return template(**kwargs)
 
 def get_button_text(key: str, lang: str = 'en') -> str:
     """Get button text for given key and language"""
-    if lang not in TRANSLATIONS:
-        lang = 'en'
-    
-    buttons = TRANSLATIONS[lang].get('buttons', {})
-    if key not in buttons:
-        # Fallback to English
-        english_buttons = TRANSLATIONS['en'].get('buttons', {})
-        return english_buttons.get(key, key)
-    
-    return buttons[key]
+    return BUTTON_TEXTS.get(lang, BUTTON_TEXTS['en']).get(key, key)
 
 def get_language_name(lang_code: str) -> str:
     """Get language name for language code"""
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Update processor for Maps to Waze Bot
+Updates from different chats run concurrently; updates within a chat run in order
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Hashable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update: object) -> Hashable:
+    """Ordering key: the chat, else the user; other updates get a key of their own"""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return ('user', update.effective_user.id)
+    return ('update', id(update))
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    At most `concurrency` updates run at once and at most one per chat, so
+    a chat's updates are handled in arrival order. Chats with waiting
+    updates take turns round-robin: after each update the chat goes to the
+    back of the line, so a flooding chat gets one slot like everyone else.
+    Updates beyond `max_chat_backlog` waiting in one chat are dropped.
+    """
+
+    def __init__(self, concurrency: int = 64, max_chat_backlog: int = 100, max_pending: int = 10000):
+        # The base semaphore only bounds updates held in memory; concurrency is enforced here
+        super().__init__(max(max_pending, concurrency))
+        self.concurrency = concurrency
+        self.max_chat_backlog = max_chat_backlog
+        self._backlogs: Dict[Hashable, Deque[asyncio.Future]] = {}  # chat -> turns waiting, oldest first
+        self._ready: Deque[Hashable] = deque()  # chats with a waiting update and nothing running
+        self._active = 0
+        self.processed = 0
+        self.dropped = 0
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        key = chat_key(update)
+        backlog = self._backlogs.get(key)
+        if backlog is not None and len(backlog) >= self.max_chat_backlog:
+            self.dropped += 1
+            coroutine.close()
+            logger.warning(f"Dropped update for chat {key}: {len(backlog)} already waiting")
+            return
+
+        turn = asyncio.get_running_loop().create_future()
+        if backlog is None:
+            # New chat: join the ready line. A known chat is either running or
+            # already in line, and its next turn is queued when it gets there
+            backlog = self._backlogs[key] = deque()
+            self._ready.append(key)
+        backlog.append(turn)
+        self._dispatch()
+
+        try:
+            await turn
+        except asyncio.CancelledError:
+            if turn.done() and not turn.cancelled():
+                self._release(key)
+            else:
+                self._discard(key, turn)
+            coroutine.close()
+            raise
+        try:
+            await coroutine
+        finally:
+            self.processed += 1
+            self._release(key)
+
+    def _dispatch(self):
+        """Grant turns to ready chats while slots are free"""
+        while self._active < self.concurrency and self._ready:
+            key = self._ready.popleft()
+            self._active += 1
+            self._backlogs[key].popleft().set_result(None)
+
+    def _release(self, key: Hashable):
+        self._active -= 1
+        backlog = self._backlogs.get(key)
+        if backlog:
+            self._ready.append(key)
+        elif backlog is not None:
+            del self._backlogs[key]
+        self._dispatch()
+
+    def _discard(self, key: Hashable, turn: asyncio.Future):
+        """Forget a turn that was cancelled before it was granted"""
+        backlog = self._backlogs.get(key)
+        if backlog is None or turn not in backlog:
+            return
+        backlog.remove(turn)
+        if not backlog and key in self._ready:
+            self._ready.remove(key)
+            del self._backlogs[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters for admin stats and metrics"""
+        return {
+            "concurrency": self.concurrency,
+            "active": self._active,
+            "waiting": sum(len(backlog) for backlog in self._backlogs.values()),
+            "chats": len(self._backlogs),
+            "processed": self.processed,
+            "dropped": self.dropped
+        }
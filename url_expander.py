@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+"""
+Short URL expansion for Maps to Waze Bot
+Redirect chain walker that reads Location headers and never downloads pages
+"""
+
+import logging
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urljoin, urlsplit
+
+import httpx
+import requests
+
+from coordinate_parser import extract_coordinates_from_url
+from endpoint_health import EndpointHealth, endpoint_health
+
+# HTTP/2 needs the optional h2 package
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Same browser-like headers the bot always used for expansion
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none'
+}
+
+
+# HEAD refused: the hop is retried with a GET whose body is not read
+HEAD_UNSUPPORTED = frozenset({405, 501})
+
+# Feature id (!1s0x..:0x..) in a data= block, or a place parameter
+_PLACE_REFERENCE_RE = re.compile(r'!1s0x[0-9a-fA-F]+:0x[0-9a-fA-F]+|[?&](?:ftid|cid|place_id|query_place_id)=')
+
+STOP_REASONS = ('coordinates', 'place_id', 'final', 'max_redirects', 'failed')
+
+
+def resolved_kind(url: str) -> Optional[str]:
+    """
+    'coordinates' or 'place_id' when a redirect target already names the
+    location, also inside the continue= of a consent redirect; else None
+    """
+    if extract_coordinates_from_url(url)[0] is not None:
+        return 'coordinates'
+    if '%' in url:
+        url = unquote(url)
+    if _PLACE_REFERENCE_RE.search(url):
+        return 'place_id'
+    return None
+
+
+class ShortUrlExpander:
+    """
+    Walk redirect chains of short links hop by hop with HEAD requests over
+    a shared keep-alive pool, stopping at the first Location that carries
+    coordinates or a place id. Page bodies are never downloaded. Each
+    host is an endpoint with an adaptive timeout (at most `timeout`) and a
+    circuit breaker; a hop to a host whose breaker is open raises
+    CircuitOpenError without a request.
+    """
+
+    def __init__(self, timeout: float = 1.0, max_redirects: int = 10,
+                 max_connections: int = 100, max_keepalive_connections: int = 20,
+                 health: Optional[EndpointHealth] = None):
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.health = health or EndpointHealth()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.expansions = 0
+        self.hops = 0
+        self.head_fallbacks = 0
+        self.bytes_received = 0
+        self.total_seconds = 0.0
+        self.stops = dict.fromkeys(STOP_REASONS, 0)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """Create the pooled client on first use (inside the running loop)"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=self.timeout,
+                limits=self.limits,
+                http2=HTTP2_AVAILABLE,
+                follow_redirects=False
+            )
+        return self._client
+
+    async def expand(self, url: str) -> str:
+        """
+        Return the first URL in the redirect chain that carries coordinates
+        or a place id, or the last URL reached
+        """
+        client = self._get_client()
+        started = time.monotonic()
+        current = url
+        stop = None
+        try:
+            for _ in range(self.max_redirects):
+                endpoint = self._endpoint(current)
+                hop_started = time.monotonic()
+                try:
+                    response = await self._send(client, 'HEAD', current, endpoint.timeout())
+                    if response.status_code in HEAD_UNSUPPORTED:
+                        self.head_fallbacks += 1
+                        response = await self._send(client, 'GET', current, endpoint.timeout())
+                except httpx.TransportError:
+                    endpoint.record_failure(time.monotonic() - hop_started)
+                    raise
+                current, stop = self._next_hop(current, response, endpoint, time.monotonic() - hop_started)
+                if stop is not None:
+                    break
+            else:
+                stop = 'max_redirects'
+            return current
+        finally:
+            self._finish(url, current, stop, started)
+
+    async def _send(self, client: httpx.AsyncClient, method: str, url: str, timeout: float) -> httpx.Response:
+        """One request without following redirects; only a redirect's (tiny) body is read"""
+        response = await client.send(client.build_request(method, url, timeout=timeout), stream=True)
+        try:
+            if method == 'GET' and response.is_redirect:
+                # Reading it keeps the connection reusable
+                await response.aread()
+        finally:
+            await response.aclose()
+        self.bytes_received += self._header_bytes(response.headers.raw) + response.num_bytes_downloaded
+        return response
+
+    def expand_blocking(self, url: str, session: requests.Session) -> str:
+        """expand() for worker threads, over a requests session"""
+        started = time.monotonic()
+        current = url
+        stop = None
+        try:
+            for _ in range(self.max_redirects):
+                endpoint = self._endpoint(current)
+                hop_started = time.monotonic()
+                try:
+                    response = session.head(current, allow_redirects=False, timeout=endpoint.timeout())
+                    if response.status_code in HEAD_UNSUPPORTED:
+                        self.head_fallbacks += 1
+                        response = session.get(current, allow_redirects=False, timeout=endpoint.timeout(),
+                                               stream=True)
+                        response.close()
+                except requests.RequestException:
+                    endpoint.record_failure(time.monotonic() - hop_started)
+                    raise
+                self.bytes_received += self._header_bytes(response.raw.headers.items() if response.raw else ())
+                current, stop = self._next_hop(current, response, endpoint, time.monotonic() - hop_started)
+                if stop is not None:
+                    break
+            else:
+                stop = 'max_redirects'
+            return current
+        finally:
+            self._finish(url, current, stop, started)
+
+    def _endpoint(self, url: str):
+        """The host's endpoint, or CircuitOpenError while its breaker is open"""
+        endpoint = self.health.endpoint(urlsplit(url).hostname or '', self.timeout)
+        endpoint.guard()
+        return endpoint
+
+    def _next_hop(self, current: str, response, endpoint, seconds: float) -> Tuple[str, Optional[str]]:
+        """(next URL, stop reason or None to keep walking) after one answered hop"""
+        self.hops += 1
+        if response.status_code >= 500:
+            endpoint.record_failure(seconds)
+        else:
+            endpoint.record_success(seconds)
+        location = response.headers.get('location')
+        if not response.is_redirect or not location:
+            return current, 'final'
+        target = urljoin(current, location)
+        kind = resolved_kind(target)
+        if kind is not None:
+            logger.info(f"Stopped expansion at redirect with {kind}: {target}")
+        return target, kind
+
+    @staticmethod
+    def _header_bytes(raw_headers) -> int:
+        return sum(len(name) + len(value) + 4 for name, value in raw_headers)
+
+    def _finish(self, url: str, current: str, stop: Optional[str], started: float):
+        seconds = time.monotonic() - started
+        stop = stop or 'failed'
+        self.expansions += 1
+        self.total_seconds += seconds
+        self.stops[stop] += 1
+        logger.debug(f"Expanded {url} -> {current} ({stop}, {seconds * 1000:.0f}ms)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hops, bytes and latency per expansion, for admin stats"""
+        expansions = self.expansions or 1
+        return {
+            "expansions": self.expansions,
+            "hops": self.hops,
+            "head_fallbacks": self.head_fallbacks,
+            "bytes_received": self.bytes_received,
+            "avg_hops": round(self.hops / expansions, 2),
+            "avg_bytes": round(self.bytes_received / expansions),
+            "avg_ms": round(self.total_seconds / expansions * 1000, 1),
+            "stops": dict(self.stops)
+        }
+
+    async def aclose(self):
+        """Close the shared connection pool"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Process-wide expander shared by all handlers
+short_url_expander = ShortUrlExpander(health=endpoint_health)
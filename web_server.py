@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+Async web server for Maps to Waze Bot
+Telegram webhook, health checks and admin routes on the Application's event loop
+"""
+
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import tornado.httpserver
+import tornado.web
+from telegram import Update
+
+logger = logging.getLogger(__name__)
+
+# (status, content_type, body, headers) as returned by the bot's GET router
+HttpResult = Tuple[int, str, bytes, Dict[str, str]]
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    """Acknowledge Telegram updates immediately and queue them for processing"""
+
+    def initialize(self, server: 'WebServer'):
+        self.server = server
+
+    def post(self):
+        server = self.server
+        if server.secret_token and \
+                self.request.headers.get('X-Telegram-Bot-Api-Secret-Token') != server.secret_token:
+            self.set_status(403)
+            return
+
+        try:
+            update = Update.de_json(json.loads(self.request.body), server.application.bot)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Invalid webhook payload: {e}")
+            self.set_status(400)
+            return
+
+        try:
+            server.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # Telegram redelivers on non-2xx responses, which is our backpressure
+            server.rejected += 1
+            self.set_status(503)
+            self.set_header('Retry-After', '1')
+            return
+
+        server.accepted += 1
+        self.set_header('Content-Type', 'application/json')
+        self.write(b'{"ok": true}')
+
+    def log_exception(self, typ, value, tb):
+        logger.error(f"Webhook error: {value}")
+
+
+class RouteHandler(tornado.web.RequestHandler):
+    """Serve health and admin GET routes through the shared router"""
+
+    def initialize(self, router: Callable[[str, str, Any], HttpResult]):
+        self.router = router
+
+    def get(self):
+        status, content_type, body, headers = self.router(self.request.path, self.request.query, self.request.headers)
+        self.set_status(status)
+        self.set_header('Content-Type', content_type)
+        for name, value in headers.items():
+            self.set_header(name, value)
+        if status != 304:
+            self.write(body)
+
+
+class WebServer:
+    """Tornado HTTP server sharing the event loop with the telegram Application"""
+
+    def __init__(self, application, router: Callable[[str, str, Any], HttpResult], port: int,
+                 webhook_path: str = '/webhook', secret_token: Optional[str] = None):
+        self.application = application
+        self.port = port
+        self.secret_token = secret_token
+        self.accepted = 0
+        self.rejected = 0
+        self._app = tornado.web.Application([
+            (webhook_path, WebhookHandler, {'server': self}),
+            (r'/.*', RouteHandler, {'router': router}),
+        ], log_function=lambda handler: None)  # Suppress per-request access logs
+        self._server: Optional[tornado.httpserver.HTTPServer] = None
+
+    async def start(self):
+        """Start listening (must be called from the running event loop)"""
+        self._server = tornado.httpserver.HTTPServer(self._app, xheaders=True)
+        self._server.listen(self.port)
+        logger.info(f"Web server listening on port {self.port}")
+
+    async def stop(self):
+        """Stop accepting connections and close open ones"""
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+
+    def get_stats(self):
+        """Webhook counters for admin stats"""
+        return {
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "queued": self.application.update_queue.qsize()
+        }
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Bounded worker pool for Maps to Waze Bot
+Runs blocking resolution work off the event loop with deadlines and backpressure
+"""
+
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool queue is full and new work is rejected"""
+
+
+class BoundedWorkerPool:
+    """Thread pool with a queue-depth limit, per-call deadlines and utilization counters"""
+
+    def __init__(self, max_workers: int = 8, max_queue: int = 32, default_timeout: float = 5.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.default_timeout = default_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='resolver')
+        self._lock = threading.Lock()
+        self._pending = 0  # submitted and not finished (queued + running)
+        self._active = 0   # running in a worker thread
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+
+    def _call(self, func: Callable, args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            self._active += 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+
+    async def run(self, func: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Run func in a worker thread and await the result.
+
+        Raises PoolBusyError when the queue is full and asyncio.TimeoutError
+        when the deadline passes. Work still waiting in the queue is cancelled
+        on timeout or when the awaiting task is cancelled; work already running
+        finishes in its thread and its result is discarded.
+        """
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolBusyError(f"Worker pool busy ({self._pending} pending)")
+            self._pending += 1
+
+        # Count on the executor future so _pending covers work still running
+        # in a thread after its awaiting task gave up
+        concurrent_future = self._executor.submit(self._call, func, args, kwargs)
+        concurrent_future.add_done_callback(self._on_done)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(concurrent_future), timeout or self.default_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"Worker pool call {getattr(func, '__name__', func)} timed out")
+            raise
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+    def _on_done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled():
+                return
+            if future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Utilization counters for admin stats and metrics"""
+        with self._lock:
+            active = self._active
+            pending = self._pending
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": active,
+            "queued": max(pending - active, 0),
+            "utilization": round(active / self.max_workers, 4),
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled
+        }
+
+    def shutdown(self):
+        """Stop accepting work and drop queued calls"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Process-wide pool for blocking resolution calls (Google Maps API)
+worker_pool = BoundedWorkerPool(
+    max_workers=int(os.getenv('WORKER_POOL_SIZE', 8)),
+    max_queue=int(os.getenv('WORKER_QUEUE_LIMIT', 32)),
+    default_timeout=float(os.getenv('WORKER_CALL_TIMEOUT', 5))
+)